@@ -0,0 +1,63 @@
+"""
+Benchmarks for limnpy.DataSource construction, inference and writing
+"""
+import shutil
+import tempfile
+
+import limnpy
+
+from .data import wide_frame, wide_rows
+
+
+SIZES = [10 ** 3, 10 ** 5, 10 ** 7]
+
+
+class DataSourceInit(object):
+    params = SIZES
+    param_names = ['rows']
+    timeout = 600
+
+    def setup(self, n):
+        self.frame = wide_frame(n)
+        self.rows = wide_rows(n)
+
+    def time_from_frame(self, n):
+        limnpy.DataSource('bench', 'Bench', self.frame)
+
+    def time_from_dict(self, n):
+        limnpy.DataSource('bench', 'Bench', self.rows)
+
+    def peakmem_from_frame(self, n):
+        limnpy.DataSource('bench', 'Bench', self.frame)
+
+
+class DataSourceInfer(object):
+    params = SIZES
+    param_names = ['rows']
+    timeout = 600
+
+    def setup(self, n):
+        self.ds = limnpy.DataSource('bench', 'Bench', wide_frame(n))
+
+    def time_infer(self, n):
+        # force, so that this keeps timing the work even where unchanged data is skipped
+        try:
+            self.ds.infer(force=True)
+        except TypeError:
+            self.ds.infer()
+
+
+class DataSourceWrite(object):
+    params = SIZES
+    param_names = ['rows']
+    timeout = 1200
+
+    def setup(self, n):
+        self.basedir = tempfile.mkdtemp()
+        self.ds = limnpy.DataSource('bench', 'Bench', wide_frame(n))
+
+    def teardown(self, n):
+        shutil.rmtree(self.basedir)
+
+    def time_write(self, n):
+        self.ds.write(self.basedir)
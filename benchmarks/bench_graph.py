@@ -0,0 +1,50 @@
+"""
+Benchmarks for building and writing limnpy.Graph and limnpy.Dashboard objects
+"""
+import shutil
+import tempfile
+
+import limnpy
+
+from .data import wide_frame
+
+
+class GraphConstruction(object):
+    params = [10, 100, 500]
+    param_names = ['metrics']
+
+    def setup(self, n):
+        self.sources = [limnpy.DataSource('bench_%d' % i, 'Bench %d' % i, wide_frame(10, n_cols=n, freq='D'))
+                        for i in range(2)]
+        self.metric_ids = [(source.source['id'], col) for source in self.sources for col in source.data.columns]
+
+    def time_all_columns(self, n):
+        limnpy.Graph('bench', 'Bench', self.sources)
+
+    def time_metric_ids(self, n):
+        limnpy.Graph('bench', 'Bench', self.sources, self.metric_ids)
+
+    def time_add_metric(self, n):
+        g = limnpy.Graph('bench', 'Bench')
+        for source in self.sources:
+            for col in source.data.columns:
+                g.add_metric(source, col)
+
+
+class DashboardWrite(object):
+    params = [10, 1000]
+    param_names = ['graphs']
+
+    def setup(self, n):
+        self.basedir = tempfile.mkdtemp()
+        source = limnpy.DataSource('bench', 'Bench', wide_frame(10, freq='D'))
+        graphs = [source.get_graph(graph_id='bench_%d' % i) for i in range(n)]
+        self.dashboard = limnpy.Dashboard('bench', 'Bench', 'Benchmark Dashboard')
+        for i in range(0, n, 10):
+            self.dashboard.add_tab('tab_%d' % i, graphs[i:i + 10])
+
+    def teardown(self, n):
+        shutil.rmtree(self.basedir)
+
+    def time_write(self, n):
+        self.dashboard.write(self.basedir)
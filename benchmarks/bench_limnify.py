@@ -0,0 +1,59 @@
+"""
+Benchmarks for end to end runs of the limnify command line tool, run in process
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+from limnpy import limnify
+
+from .data import write_long_tsv, write_wide_tsv, WIDE_DATE_FMT
+
+
+SIZES = [10 ** 3, 10 ** 5, 10 ** 7]
+
+
+def run_limnify(argv):
+    old_argv, old_stderr = sys.argv, sys.stderr
+    sys.argv = ['limnify'] + argv
+    sys.stderr = open(os.devnull, 'w')
+    try:
+        limnify.main()
+    finally:
+        sys.stderr.close()
+        sys.argv, sys.stderr = old_argv, old_stderr
+
+
+class Limnify(object):
+    params = SIZES
+    param_names = ['rows']
+    timeout = 1800
+
+    def setup_cache(self):
+        # inputs are generated once per benchmark run rather than once per repeat
+        inputdir = os.path.abspath('limnify_inputs')
+        if not os.path.isdir(inputdir):
+            os.makedirs(inputdir)
+        for n in SIZES:
+            write_wide_tsv(os.path.join(inputdir, 'wide_%d.tsv' % n), n)
+            write_long_tsv(os.path.join(inputdir, 'long_%d.tsv' % n), n)
+        return inputdir
+
+    def setup(self, inputdir, n):
+        self.basedir = tempfile.mkdtemp()
+
+    def teardown(self, inputdir, n):
+        shutil.rmtree(self.basedir)
+
+    def time_plain(self, inputdir, n):
+        run_limnify(['--datefmt=' + WIDE_DATE_FMT, '--basedir', self.basedir,
+                     os.path.join(inputdir, 'wide_%d.tsv' % n)])
+
+    def time_pivot(self, inputdir, n):
+        run_limnify(['--datefmt=%Y-%m-%d_%H', '--pivot', '--basedir', self.basedir,
+                     os.path.join(inputdir, 'long_%d.tsv' % n)])
+
+    def peakmem_pivot(self, inputdir, n):
+        run_limnify(['--datefmt=%Y-%m-%d_%H', '--pivot', '--basedir', self.basedir,
+                     os.path.join(inputdir, 'long_%d.tsv' % n)])
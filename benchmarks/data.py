@@ -0,0 +1,75 @@
+"""
+Synthetic data generators shared by the benchmarks
+"""
+import csv
+import numpy as np
+import pandas as pd
+
+
+START = pd.Timestamp('2010-01-01')
+
+# frequencies from coarse to fine, with the length of one period
+_FREQS = [('D', pd.Timedelta(days=1)), ('H', pd.Timedelta(hours=1)),
+          ('T', pd.Timedelta(minutes=1)), ('S', pd.Timedelta(seconds=1))]
+
+# date format of the wide tsv, fine enough for the minutely dates of the largest sizes
+WIDE_DATE_FMT = '%Y-%m-%d_%H:%M:%S'
+
+
+def fitting_freq(n_rows, freq):
+    """
+    `freq`, or the next finer of D, H, T and S if `n_rows` periods of `freq` from START would run
+    past pandas.Timestamp.max (10 ** 7 hours or days do)
+    """
+    names = [name for name, length in _FREQS]
+    # in seconds, multiplying the Timedeltas themselves overflows for the sizes being checked
+    room = (pd.Timestamp.max - START).total_seconds()
+    for name, length in _FREQS[names.index(freq):]:
+        if length.total_seconds() * n_rows < room:
+            return name
+    raise ValueError('%d periods do not fit in a pandas DatetimeIndex' % n_rows)
+
+
+def wide_frame(n_rows, n_cols=5, freq='H', seed=0):
+    """
+    a datetime indexed DataFrame of `n_rows` consecutive periods with `n_cols` integer columns.
+    The periods are `freq` long, or shorter for sizes which wouldn't fit, see fitting_freq
+    """
+    rng = np.random.RandomState(seed)
+    index = pd.date_range(START, periods=n_rows, freq=fitting_freq(n_rows, freq))
+    columns = ['metric_%d' % i for i in range(n_cols)]
+    return pd.DataFrame(rng.randint(0, 1000000, size=(n_rows, n_cols)), index=index, columns=columns)
+
+
+def wide_rows(n_rows, n_cols=5, freq='D'):
+    """ the same data as wide_frame, as the dict of lists with a `date` column most callers start from """
+    df = wide_frame(n_rows, n_cols, freq)
+    rows = dict((col, df[col].values) for col in df.columns)
+    rows['date'] = df.index.to_pydatetime()
+    return rows
+
+
+def write_long_tsv(path, n_rows, n_metrics=50, seed=0):
+    """
+    writes a "long" format tsv like the hourly per-continent logs limnify is usually run on:
+    a header followed by `n_rows` (hour, metric, count) rows, with each hour repeated once per metric
+    """
+    rng = np.random.RandomState(seed)
+    n_hours = max(1, n_rows // n_metrics)
+    hours = pd.date_range(START, periods=n_hours, freq='H')
+    hour_strs = np.array([ts.strftime('%Y-%m-%d_%H') for ts in hours], dtype=object)
+    metrics = np.array(['metric_%d' % i for i in range(n_metrics)], dtype=object)
+    idx = np.arange(n_rows)
+    df = pd.DataFrame({
+        'hour' : hour_strs[(idx // n_metrics) % n_hours],
+        'metric' : metrics[idx % n_metrics],
+        'count' : rng.randint(0, 1000000, size=n_rows),
+    }, columns=['hour', 'metric', 'count'])
+    df.to_csv(path, sep='\t', index=False)
+
+
+def write_wide_tsv(path, n_rows, n_cols=5):
+    """ writes a "wide" tsv with an hourly (minutely for 10 ** 7 rows) `hour` column followed by `n_cols` metric columns """
+    df = wide_frame(n_rows, n_cols)
+    df.index = [ts.strftime(WIDE_DATE_FMT) for ts in df.index]
+    df.to_csv(path, sep='\t', index_label='hour', quoting=csv.QUOTE_NONE)
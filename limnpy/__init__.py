@@ -1,6 +1,33 @@
+
+import sys
+import types
+
 from graph import Graph
-from datasource import DataSource
 from dashboard import Dashboard
-__all__ = ['Graph', 'DataSource', 'Dashboard']
+from dictwriter import DictWriter
+__all__ = ['Graph', 'DataSource', 'Dashboard', 'Batch', 'DictWriter']
+
+# DataSource and Batch need pandas, which takes longer to import than most metadata-only
+# uses (graphs, dashboards, DictWriter) take to run, so they are imported on first access
+_lazy = {
+    'DataSource' : 'datasource',
+    'Batch' : 'batch',
+}
+
+
+class _LazyModule(types.ModuleType):
+
+    def __getattr__(self, name):
+        if name not in _lazy:
+            raise AttributeError("'module' object has no attribute '%s'" % name)
+        module = __import__('%s.%s' % (self.__name__, _lazy[name]), fromlist=[name])
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
 
 
+_module = _LazyModule(__name__)
+_module.__dict__.update(sys.modules[__name__].__dict__)
+# keeps this module object alive, python 2 clears the globals of modules when they are freed
+_module._module = sys.modules[__name__]
+sys.modules[__name__] = _module
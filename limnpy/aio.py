@@ -0,0 +1,159 @@
+"""
+Non-blocking writes for embedding limnpy in event loop based services.  The functions here return
+concurrent.futures.Future objects straight away and do the serialization and file I/O on a thread
+pool, so they can be awaited from asyncio with asyncio.wrap_future (and gathered), or waited on
+with concurrent.futures.wait from anything else:
+
+    futures = limnpy.aio.write_all_async([ds, graph, dashboard], 'limn-data', limit=8)
+    await asyncio.gather(*[asyncio.wrap_future(f) for f in futures])
+
+On python 2 this needs the `futures` backport of concurrent.futures.
+"""
+import os, logging
+import json
+import threading
+
+from output import default_output
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _futures():
+    try:
+        from concurrent import futures
+    except ImportError:
+        raise ImportError('limnpy.aio needs concurrent.futures, on python 2 install the `futures` package')
+    return futures
+
+
+def default_executor(workers=4):
+    """ the thread pool shared by writes which aren't given an executor, created on first use """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _futures().ThreadPoolExecutor(workers)
+        return _executor
+
+
+def write_async(obj, basedir='.', executor=None, output=None, **kwargs):
+    """
+    Starts writing the DataSource, Graph or Dashboard `obj` to `basedir` on `executor` and returns
+    a Future which is done once everything is written (or raises the write's exception).  Extra
+    kwargs are passed on to obj.write().  For a DataSource the data is inferred first, then the
+    datafile is serialized and written at the same time as the datasource JSON; appending and
+    sharded writes are done as a single task.  The Future's result is `obj`
+    """
+    from datasource import DataSource
+    futures = _futures()
+    executor = executor if executor is not None else default_executor()
+    output = output if output is not None else default_output
+    if isinstance(obj, DataSource) and not kwargs.get('append') and kwargs.get('shard') is None:
+        return _write_datasource(futures, obj, basedir, executor, output, **kwargs)
+    return executor.submit(_write, obj, basedir, output, kwargs)
+
+
+def _write(obj, basedir, output, kwargs):
+    obj.write(basedir, output=output, **kwargs)
+    return obj
+
+
+def write_all_async(objs, basedir='.', limit=4, executor=None, **kwargs):
+    """
+    Starts writing each of `objs` with write_async, at most `limit` objects at a time, and returns
+    a list with a Future for each object in the same order, ready for asyncio.gather (once wrapped)
+    or concurrent.futures.wait.  A failing write only fails its own Future
+    """
+    futures = _futures()
+    objs = list(objs)
+    results = [futures.Future() for obj in objs]
+    queue = iter(list(enumerate(objs)))
+    lock = threading.Lock()
+
+    def start_next():
+        while True:
+            with lock:
+                item = next(queue, None)
+            if item is None:
+                return
+            i, obj = item
+            try:
+                task = write_async(obj, basedir, executor=executor, **kwargs)
+            except Exception as e:
+                results[i].set_exception(e)
+                continue
+            task.add_done_callback(lambda task, i=i : (_chain(task, results[i]), start_next()))
+            return
+
+    for _ in range(min(limit, len(objs))):
+        start_next()
+    return results
+
+
+def _write_datasource(futures, ds, basedir, executor, output, append=False, shard=None, gzip=False, float_precision=None):
+    result = futures.Future()
+    try:
+        extension, writer = ds._check_write(False, None, gzip)
+    except Exception as e:
+        result.set_exception(e)
+        return result
+
+    def prepare():
+        ds.infer()
+        df_dir, df_path, ds_dir, ds_path = ds._paths(basedir, extension)
+        output.makedirs(df_dir)
+        output.makedirs(ds_dir)
+        return df_path, ds_path
+
+    def write(prepared):
+        if prepared.exception() is not None:
+            result.set_exception(prepared.exception())
+            return
+        df_path, ds_path = prepared.result()
+        try:
+            tasks = [executor.submit(ds._write_datafile, ds.data, df_path, output, writer, gzip, float_precision),
+                     executor.submit(output.write, ds_path, json.dumps(ds.source, indent=4))]
+        except Exception as e:
+            result.set_exception(e)
+            return
+        _when_all(tasks, lambda : _finish(result, tasks, ds))
+
+    executor.submit(prepare).add_done_callback(write)
+    return result
+
+
+def _when_all(tasks, callback):
+    """ calls `callback` once every future in `tasks` is done """
+    remaining = [len(tasks)]
+    lock = threading.Lock()
+
+    def done(task):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback()
+
+    for task in tasks:
+        task.add_done_callback(done)
+
+
+def _finish(result, tasks, ds):
+    """ fails `result` with the first exception of the done `tasks`, otherwise resolves it to `ds` """
+    for task in tasks:
+        if task.exception() is not None:
+            result.set_exception(task.exception())
+            return
+    ds.wrote = True
+    result.set_result(ds)
+
+
+def _chain(task, result):
+    """ resolves `result` the same way as the done future `task` """
+    if task.exception() is not None:
+        result.set_exception(task.exception())
+    else:
+        result.set_result(task.result())
@@ -0,0 +1,126 @@
+import os, logging
+import traceback
+import multiprocessing
+import multiprocessing.pool
+
+from graph import Graph
+from datasource import DataSource
+from dashboard import Dashboard
+from output import Output, makedirs
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Batch(object):
+    """
+    Collects limnpy.DataSource, limnpy.Graph and limnpy.Dashboard objects which
+    all belong to the same limn installation (`basedir`) and writes them out together
+    using a pool of worker processes or threads.  The output directories are created
+    once up front (and not checked again by each object's write), and an error writing one
+    object is logged and reported but does not stop the rest of the batch.  After write(), the
+    `written` and `skipped` attributes count the files which were written and the ones left
+    alone because their contents hadn't changed.  With pool='process' each object is written
+    by a copy of it in a worker process, so any metadata the write changes (e.g. a
+    `source['url']` whose extension is changed to match the datafile format, or metadata
+    re-inferred from data modified after the object was added) stays in the worker and the
+    objects held by the batch don't see it.  Use pool='thread' if they are used after the write
+
+        >>> import limnpy, datetime
+        >>> rows = [[datetime.date(2012, 9, 1), 1, 2],
+        ...         [datetime.date(2012, 10, 1), 7, 9]]
+        >>> batch = limnpy.Batch('doctest_tmp', workers=2)
+        >>> ds = batch.add(limnpy.DataSource('batch_source', 'Batch Source', rows, labels=['date', 'x', 'y']))
+        >>> g = batch.add(ds.get_graph())
+        >>> batch.write()
+        []
+        >>> sorted(os.listdir('doctest_tmp/graphs'))
+        ['batch_source.json']
+    """
+
+    subdirs = ['datafiles', 'datasources', 'graphs', 'dashboards']
+
+    def __init__(self, basedir='.', objs=None, workers=None, pool='process'):
+        """
+        Args:
+            basedir (str)  : directory in which to place the datasources, datafiles, graphs
+                             and dashboards directories
+            objs    (list) : initial list of DataSource, Graph and Dashboard objects to write
+            workers (int)  : number of workers to use, defaults to the number of cpus.
+                             with 1 worker everything is written in the calling process
+            pool    (str)  : either `process` or `thread`.  processes side-step the GIL for
+                             the csv / json serialization but need to pickle each object,
+                             and changes which the writes make to the objects stay in the workers
+        """
+        if pool not in ('process', 'thread'):
+            raise ValueError('pool must be one of `process` or `thread`, not: %s' % pool)
+        self.basedir = basedir
+        self.objs = list(objs) if objs is not None else []
+        self.workers = workers if workers else multiprocessing.cpu_count()
+        self.pool = pool
+        self.written = 0
+        self.skipped = 0
+
+
+    def add(self, obj):
+        """ Adds a DataSource, Graph or Dashboard to the batch and returns it """
+        if not isinstance(obj, (DataSource, Graph, Dashboard)):
+            raise ValueError('can only add limnpy.DataSource, limnpy.Graph or limnpy.Dashboard objects, not: %s' % type(obj))
+        self.objs.append(obj)
+        return obj
+
+
+    def write(self):
+        """
+        Writes every object in the batch to `self.basedir`.
+        Returns:
+            a list of (object_id, traceback_str) tuples, one for each object which
+            could not be written.  An empty list means everything was written
+        """
+        dirs = [os.path.join(self.basedir, subdir) for subdir in self.subdirs]
+        for path in dirs:
+            makedirs(path)
+
+        jobs = [(obj, self.basedir, dirs) for obj in self.objs]
+        if self.workers == 1 or len(jobs) <= 1:
+            results = map(_write_one, jobs)
+        else:
+            if self.pool == 'process':
+                pool = multiprocessing.Pool(self.workers)
+            else:
+                pool = multiprocessing.pool.ThreadPool(self.workers)
+            try:
+                chunksize = max(1, len(jobs) // (4 * self.workers))
+                results = pool.map(_write_one, jobs, chunksize)
+            finally:
+                pool.close()
+                pool.join()
+
+        failures = [(obj_id, error) for obj_id, error, written, skipped in results if error is not None]
+        self.written = sum(written for obj_id, error, written, skipped in results)
+        self.skipped = sum(skipped for obj_id, error, written, skipped in results)
+        for obj_id, error in failures:
+            logger.error('error writing %s:\n%s', obj_id, error)
+        logger.debug('wrote %d of %d objects to %s (%d files written, %d unchanged)',
+                len(jobs) - len(failures), len(jobs), self.basedir, self.written, self.skipped)
+        return failures
+
+
+def _object_id(obj):
+    if isinstance(obj, DataSource):
+        return 'datasource:%s' % obj.source['id']
+    elif isinstance(obj, Graph):
+        return 'graph:%s' % obj.graph['id']
+    else:
+        return 'dashboard:%s' % obj.id
+
+
+def _write_one(job):
+    """ module level so that it can be pickled for use by multiprocessing workers """
+    obj, basedir, dirs = job
+    output = Output(dirs=dirs)
+    try:
+        obj.write(basedir, output=output)
+        return _object_id(obj), None, output.written, output.skipped
+    except Exception:
+        return _object_id(obj), traceback.format_exc(), output.written, output.skipped
@@ -0,0 +1,325 @@
+"""
+Declarative builds of a whole limn site, like make for limn.  A site file lists the inputs and
+how to turn them into datasources, and the graphs and dashboards built on top of them:
+
+    basedir: limn-data
+    defaults:                         # limnify options shared by every datasource
+      datefmt: '%Y-%m-%d_%H'
+    datasources:
+      - id: continents
+        input: data/continents.tsv
+        name: Pageviews by Continent
+        pivot: true
+    graphs:
+      - id: continents
+        title: Pageviews by Continent
+        datasources: [continents]     # every column of these datasources
+      - id: asia_vs_africa
+        title: Asia vs Africa
+        metrics: [[continents, Asia], [continents, Africa]]
+    dashboards:
+      - id: reportcard
+        name: Report Card
+        headline: Monthly numbers
+        tabs:
+          - name: Traffic
+            graphs: [continents, asia_vs_africa]
+
+Relative paths are relative to the site file.  A state file in the basedir records a fingerprint of
+every node: a datasource's spec and the size and mtime of its input, a graph's spec and the columns
+of the datasources it plots, and a dashboard's spec and the slugs of its graphs.  A build only
+rebuilds the nodes whose fingerprint changed (or whose output is missing), so new rows in an input
+rebuild its datasource but not the graphs on top of it unless its columns changed.  The nodes of each
+kind are independent of each other and are built in parallel.
+"""
+import os, sys, logging
+import json
+import hashlib
+import traceback
+import multiprocessing
+import multiprocessing.pool
+
+from output import Output, makedirs, _atomic_write
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Site(object):
+
+    def __init__(self, spec, root='.', workers=None, state_path=None):
+        """
+        Args:
+            spec    (dict) : the parsed site file, see the module docstring
+            root    (str)  : directory which relative paths in `spec` are relative to
+            workers (int)  : number of processes (for datasources) and threads (for graphs and
+                             dashboards) to build with, defaults to the number of cpus
+            state_path (str) : JSON file to keep the fingerprints in, defaults to {basedir}/.limnpy_build.json
+        """
+        self.spec = spec
+        self.root = root
+        self.basedir = os.path.join(root, spec.get('basedir', '.'))
+        self.workers = workers if workers else multiprocessing.cpu_count()
+        self.state_path = state_path or os.path.join(self.basedir, '.limnpy_build.json')
+        self.defaults = spec.get('defaults') or {}
+        self.datasources = _by_id(spec.get('datasources'), 'datasource')
+        self.graphs = _by_id(spec.get('graphs'), 'graph')
+        self.dashboards = _by_id(spec.get('dashboards'), 'dashboard')
+        self.state = {'datasources' : {}, 'graphs' : {}, 'dashboards' : {}}
+        if os.path.exists(self.state_path):
+            self.state.update(json.load(open(self.state_path)))
+
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """ reads the site file at `path`, YAML or (faster to parse for very large sites) JSON """
+        with open(path) as f:
+            if path.endswith('.json'):
+                spec = json.load(f)
+            else:
+                import yaml
+                spec = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+        return cls(spec or {}, root=os.path.dirname(path) or '.', **kwargs)
+
+
+    def build(self, force=False, dry_run=False):
+        """
+        Rebuilds the out of date datasources, then graphs, then dashboards (or all of them with
+        `force`).  Nodes downstream of a failure are skipped and left out of date.  Returns a dict
+        with the `built`, `skipped` (up to date), `failed` and `blocked` node names and the
+        (node, error) pairs of the failures.  With `dry_run` nothing is built and `built` lists
+        what would have been
+        """
+        report = {'built' : [], 'skipped' : [], 'failed' : [], 'blocked' : [], 'errors' : []}
+        output = Output()
+
+        # datasources
+        todo = []
+        for ds_id, spec in self.datasources.items():
+            fp = self._datasource_fingerprint(ds_id, spec)
+            path = os.path.join(self.basedir, 'datasources', ds_id + '.json')
+            entry = self.state['datasources'].get(ds_id)
+            if force or entry is None or entry['fp'] != fp or not os.path.exists(path):
+                todo.append((ds_id, spec, fp))
+            else:
+                report['skipped'].append('datasource:%s' % ds_id)
+        failed = set()
+        results = self._run(_build_datasource, [(ds_id, self._job(ds_id, spec)) for ds_id, spec, fp in todo],
+                            processes=True, dry_run=dry_run)
+        for (ds_id, spec, fp), (error, meta) in zip(todo, results):
+            self._record(report, 'datasource:%s' % ds_id, error)
+            if error is not None:
+                failed.add(ds_id)
+                self.state['datasources'].pop(ds_id, None)
+            elif not dry_run:
+                self.state['datasources'][ds_id] = {'fp' : fp, 'meta' : meta}
+
+        # graphs
+        todo = []
+        for graph_id, spec in self.graphs.items():
+            sources = _graph_sources(spec)
+            if failed.intersection(sources):
+                report['blocked'].append('graph:%s' % graph_id)
+                failed.add('graph:%s' % graph_id)
+                self.state['graphs'].pop(graph_id, None)
+                continue
+            fp = _fingerprint(spec, [self._datasource_meta(ds_id) for ds_id in sources])
+            path = os.path.join(self.basedir, 'graphs', graph_id + '.json')
+            if force or self.state['graphs'].get(graph_id) != fp or not os.path.exists(path):
+                todo.append((graph_id, spec, fp))
+            else:
+                report['skipped'].append('graph:%s' % graph_id)
+        loader = _SourceLoader(self.basedir)
+        results = self._run(_build_graph, [(graph_id, spec, loader, output) for graph_id, spec, fp in todo],
+                            dry_run=dry_run)
+        for (graph_id, spec, fp), (error, meta) in zip(todo, results):
+            self._record(report, 'graph:%s' % graph_id, error)
+            if error is not None:
+                failed.add('graph:%s' % graph_id)
+                self.state['graphs'].pop(graph_id, None)
+            elif not dry_run:
+                self.state['graphs'][graph_id] = fp
+
+        # dashboards
+        todo = []
+        for db_id, spec in self.dashboards.items():
+            graph_ids = [graph_id for tab in spec.get('tabs', []) for graph_id in tab.get('graphs', [])]
+            if failed.intersection('graph:%s' % graph_id for graph_id in graph_ids):
+                report['blocked'].append('dashboard:%s' % db_id)
+                self.state['dashboards'].pop(db_id, None)
+                continue
+            fp = _fingerprint(spec, [self._slug(graph_id) for graph_id in graph_ids])
+            path = os.path.join(self.basedir, 'dashboards', db_id + '.json')
+            if force or self.state['dashboards'].get(db_id) != fp or not os.path.exists(path):
+                todo.append((db_id, spec, fp))
+            else:
+                report['skipped'].append('dashboard:%s' % db_id)
+        results = self._run(_build_dashboard, [(db_id, spec, self._slug, self.basedir, output) for db_id, spec, fp in todo],
+                            dry_run=dry_run)
+        for (db_id, spec, fp), (error, meta) in zip(todo, results):
+            self._record(report, 'dashboard:%s' % db_id, error)
+            if error is not None:
+                self.state['dashboards'].pop(db_id, None)
+            elif not dry_run:
+                self.state['dashboards'][db_id] = fp
+
+        if not dry_run and (report['built'] or report['failed'] or report['blocked']):
+            makedirs(self.basedir)
+            _atomic_write(self.state_path, json.dumps(self.state, sort_keys=True))
+        return report
+
+
+    def _run(self, func, jobs, processes=False, dry_run=False):
+        """ maps `func` over `jobs` in a pool of worker processes or threads, returning a list of (error, result) """
+        if dry_run:
+            return [(None, None)] * len(jobs)
+        if self.workers == 1 or len(jobs) <= 1:
+            return map(func, jobs)
+        if processes:
+            pool = multiprocessing.Pool(self.workers)
+        else:
+            pool = multiprocessing.pool.ThreadPool(self.workers)
+        try:
+            return pool.map(func, jobs, max(1, len(jobs) // (4 * self.workers)))
+        finally:
+            pool.close()
+            pool.join()
+
+
+    def _record(self, report, name, error):
+        if error is None:
+            report['built'].append(name)
+        else:
+            report['failed'].append(name)
+            report['errors'].append((name, error))
+
+
+    def _job(self, ds_id, spec):
+        """ the limnify arguments for building the datasource `ds_id` """
+        from limnpy import limnify
+        args = limnify.job_args(limnify.make_parser().parse_args([]), self.defaults, spec)
+        args.data = os.path.join(self.root, args.data)
+        args.basedir = self.basedir
+        return args
+
+
+    def _datasource_fingerprint(self, ds_id, spec):
+        path = os.path.join(self.root, spec.get('input', ''))
+        try:
+            stat = os.stat(path)
+            input_sig = [stat.st_size, stat.st_mtime]
+        except OSError:
+            input_sig = None
+        return _fingerprint(self.defaults, spec, input_sig)
+
+
+    def _datasource_meta(self, ds_id):
+        """ the column metadata digest of a datasource, from the state for ones built by the site """
+        entry = self.state['datasources'].get(ds_id)
+        if entry is not None:
+            return entry['meta']
+        # a datasource built outside of the site, fingerprinted by its datasource file
+        path = os.path.join(self.basedir, 'datasources', ds_id + '.json')
+        try:
+            stat = os.stat(path)
+            return [stat.st_size, stat.st_mtime]
+        except OSError:
+            return None
+
+
+    def _slug(self, graph_id):
+        spec = self.graphs.get(graph_id) or {}
+        return spec.get('slug', graph_id)
+
+
+def _by_id(specs, kind):
+    nodes = {}
+    for spec in specs or []:
+        if 'id' not in spec:
+            raise ValueError('every %s needs an id: %s' % (kind, spec))
+        if spec['id'] in nodes:
+            raise ValueError('duplicate %s id: %s' % (kind, spec['id']))
+        nodes[spec['id']] = spec
+    return nodes
+
+
+def _fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+
+def _graph_sources(spec):
+    """ the ids of the datasources a graph spec plots, in order """
+    ids = list(spec.get('datasources', []))
+    for ds_id, col in spec.get('metrics', []):
+        if ds_id not in ids:
+            ids.append(ds_id)
+    return ids
+
+
+class _SourceLoader(object):
+    """ caches DataSource.load() handles, which many graphs of a site tend to share """
+
+    def __init__(self, basedir):
+        self.basedir = basedir
+        self.sources = {}
+
+    def __call__(self, ds_id):
+        if ds_id not in self.sources:
+            from datasource import DataSource
+            self.sources[ds_id] = DataSource.load(self.basedir, ds_id)
+        return self.sources[ds_id]
+
+
+def _build_datasource(job):
+    """ module level so that it can be pickled for use by multiprocessing workers """
+    ds_id, args = job
+    try:
+        from limnpy import limnify
+        args.id = ds_id
+        limnify.limnify(args)
+        source = json.load(open(os.path.join(args.basedir, 'datasources', ds_id + '.json')))
+        return None, _fingerprint(source['columns'])
+    except Exception:
+        return traceback.format_exc(), None
+
+
+def _build_graph(job):
+    graph_id, spec, loader, output = job
+    try:
+        from graph import Graph
+        sources = [loader(ds_id) for ds_id in _graph_sources(spec)]
+        metric_ids = [tuple(metric) for metric in spec['metrics']] if 'metrics' in spec else None
+        graph = Graph(graph_id, spec.get('title', graph_id), sources, metric_ids, slug=spec.get('slug'))
+        graph.write(loader.basedir, output=output)
+        return None, None
+    except Exception:
+        return traceback.format_exc(), None
+
+
+def _build_dashboard(job):
+    db_id, spec, slug, basedir, output = job
+    try:
+        from dashboard import Dashboard
+        tabs = [{'name' : tab['name'], 'graph_ids' : [slug(graph_id) for graph_id in tab.get('graphs', [])]}
+                for tab in spec.get('tabs', [])]
+        dashboard = Dashboard(db_id, spec.get('name', db_id), spec.get('headline', ''), spec.get('subhead', ''), tabs=tabs)
+        dashboard.write(basedir, output=output)
+        return None, None
+    except Exception:
+        return traceback.format_exc(), None
+
+
+def run(args):
+    """ `limnpy build` """
+    site = Site.load(args.site, workers=args.workers)
+    report = site.build(force=args.force, dry_run=args.dry_run)
+    for name, error in report['errors']:
+        sys.stderr.write('limnpy build: %s failed:\n%s\n' % (name, error))
+    for name in report['blocked']:
+        sys.stderr.write('limnpy build: %s skipped, it depends on a failed build\n' % name)
+    if args.dry_run:
+        for name in report['built']:
+            sys.stdout.write('%s\n' % name)
+    sys.stderr.write('limnpy build: %d %s, %d up to date, %d failed\n' % (len(report['built']),
+            'to build' if args.dry_run else 'built', len(report['skipped']), len(report['failed']) + len(report['blocked'])))
+    return 1 if report['failed'] or report['blocked'] else 0
@@ -0,0 +1,111 @@
+import logging
+import pandas as pd
+
+from datasource import DataSource
+from graph import Graph
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def bundle(sources, limn_id, limn_name, sep='.', date_fmt=None, limn_group='', url=None):
+    """
+    Combines the limnpy.DataSource objects `sources` into one wide DataSource, so that a dashboard
+    plotting many small datasources fetches and parses a single datafile.  The frames are outer
+    joined on their dates in one pandas.concat (dates missing from a source are left empty), and
+    each column is labeled `{source id}{sep}{label}` so that columns with the same label in
+    different sources stay apart.  The columns keep their types and their order within each source.
+    Use rebase_graph() to point graphs built from `sources` at the bundle.
+
+        >>> import datetime
+        >>> a = DataSource('a', 'A', {'date' : [datetime.date(2012, 9, 1), datetime.date(2012, 10, 1)], 'x' : [1, 7]})
+        >>> b = DataSource('b', 'B', {'date' : [datetime.date(2012, 10, 1)], 'x' : [2], 'y' : [3]})
+        >>> both = bundle([a, b], 'ab', 'A and B')
+        >>> [(col['label'], col['type']) for col in both.source['columns']]
+        [('date', 'date'), ('a.x', 'int'), ('b.x', 'int'), ('b.y', 'int')]
+        >>> len(both.data), int(both.data['b.y'].isnull().sum())
+        (2, 1)
+
+    Args:
+        sources    (list) : the DataSources to combine, with distinct ids
+        limn_id    (str)  : the id of the bundled datasource
+        limn_name  (str)  : the name of the bundled datasource
+        sep        (str)  : separator between the source id and the column label
+        date_fmt   (str)  : date format of the bundle, defaults to the date format the sources share
+        limn_group (str)  : see DataSource
+        url        (str)  : see DataSource
+    Returns:
+        a DataSource
+    """
+    sources = list(sources)
+    if not sources:
+        raise ValueError('no datasources to bundle')
+    ids = [source.source['id'] for source in sources]
+    if len(set(ids)) != len(ids):
+        raise ValueError('the bundled datasources need distinct ids: %s' % ids)
+    if date_fmt is None:
+        date_fmts = set(source.date_fmt for source in sources)
+        if len(date_fmts) > 1:
+            raise ValueError('the datasources have different date formats %s, pass the one to use as date_fmt' % sorted(date_fmts))
+        date_fmt = date_fmts.pop()
+
+    frames = []
+    types = ['date']
+    for source in sources:
+        source.infer()
+        columns = source.source['columns'][1:]
+        frame = source.data.copy(deep=False)
+        frame.columns = [_label(source.source['id'], col['label'], sep) for col in columns]
+        frames.append(frame)
+        types.extend(col['type'] for col in columns)
+    # one concat aligns every frame on the union of their dates at once, rather than
+    # joining them pairwise and reallocating the growing frame for each source
+    data = pd.concat(frames, axis=1, join='outer', copy=False)
+    logger.debug('bundled %d datasources into %d rows and %d columns', len(frames), len(data), len(data.columns))
+
+    bundled = DataSource(limn_id, limn_name, data, limn_group=limn_group, url=url, types=types,
+            date_fmt=date_fmt, copy=False)
+    steps = set(source.source['timespan'].get('step') for source in sources)
+    if len(steps) == 1:
+        bundled.source['timespan']['step'] = steps.pop()
+    return bundled
+
+
+def rebase_graph(graph, sources, bundled, sep='.'):
+    """
+    Points the metrics of the limnpy.Graph `graph` which plot a column of one of `sources` at the
+    same column of `bundled` (as returned by bundle() with the same `sep`), updating each metric's
+    `source_id`, `source_col` and `type` in place.  Metrics without a label of their own are given
+    the original column label, so the legend doesn't show the namespaced one.  Metrics of other
+    datasources are left alone.  Returns the number of metrics rebased
+    """
+    by_id = dict((source.source['id'], source) for source in sources)
+    bundled_id = bundled.source['id']
+    bundled_cols = bundled.source['columns']
+    bundled_index = bundled.column_index()
+    rebased = 0
+    for node in graph.graph['root']['children'][Graph.METRIC_CHILD_ID]['children']:
+        metric = node['metric']
+        source = by_id.get(metric['source_id'])
+        if source is None:
+            continue
+        label = source.source['columns'][metric['source_col']]['label']
+        col_idx = bundled_index.get(_label(metric['source_id'], label, sep))
+        if col_idx is None:
+            raise ValueError('column %s of %s is not in the bundled datasource %s' % (label, metric['source_id'], bundled_id))
+        if node['options'].get('label') is None:
+            node['options']['label'] = label
+        metric['source_id'] = bundled_id
+        metric['source_col'] = col_idx
+        metric['type'] = bundled_cols[col_idx]['type']
+        rebased += 1
+    return rebased
+
+
+def rebase_graphs(graphs, sources, bundled, sep='.'):
+    """ rebase_graph() for each of `graphs`, returns the total number of metrics rebased """
+    return sum(rebase_graph(graph, sources, bundled, sep) for graph in graphs)
+
+
+def _label(source_id, label, sep):
+    return '%s%s%s' % (source_id, sep, label)
@@ -0,0 +1,47 @@
+import argparse
+import sys
+
+
+def make_parser():
+    """ the `limnpy` command line parser, with one subcommand per tool """
+    parser = argparse.ArgumentParser(prog='limnpy', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+
+    build = subparsers.add_parser('build', formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+            help='build the datasources, graphs and dashboards of a site file, only rebuilding what changed')
+    build.add_argument('site', help='YAML (or JSON) file describing the site, see limnpy.build')
+    build.add_argument('--force', action='store_true', default=False, help='rebuild everything, even the up to date parts')
+    build.add_argument('--workers', type=int, default=None, help='number of worker processes, defaults to the number of cpus')
+    build.add_argument('--dry_run', action='store_true', default=False, help='only list what would be rebuilt')
+    build.set_defaults(run=_build)
+
+    serve = subparsers.add_parser('serve', formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+            help='serve a data directory for previewing, with gzip, ETags and range requests')
+    serve.add_argument('basedir', nargs='?', default='.', help='the directory holding the datasources, datafiles, graphs and dashboards')
+    serve.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    serve.add_argument('--port', type=int, default=8000, help='port to listen on')
+    serve.add_argument('--cache_mb', type=int, default=64, help='megabytes of file contents to keep in memory')
+    serve.set_defaults(run=_serve)
+
+    return parser
+
+
+def _build(args):
+    from limnpy import build
+    return build.run(args)
+
+
+def _serve(args):
+    from limnpy import serve
+    return serve.run(args)
+
+
+def main():
+    args = make_parser().parse_args()
+    status = args.run(args)
+    if status:
+        sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
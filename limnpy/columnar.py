@@ -0,0 +1,145 @@
+"""
+Reads Parquet, Feather and Arrow IPC files straight into pandas.DataFrames with pyarrow, so exports
+from a columnar warehouse don't have to be converted to text and parsed again.  Only the requested
+columns are read, and for Parquet the row groups whose date column statistics lie entirely outside
+the requested date range are skipped without being read.  Row groups are coarse, so callers still
+filter the rows they get back (see between()).
+
+pyarrow is only needed for reading these formats.
+"""
+import os, logging
+import datetime
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# file extension -> format
+FORMATS = {
+    '.parquet' : 'parquet',
+    '.pq' : 'parquet',
+    '.feather' : 'feather',
+    # feather version 2 is the Arrow IPC file format, so these are read the same way
+    '.arrow' : 'feather',
+    '.ipc' : 'feather',
+}
+
+
+def format_of(path):
+    """ returns the columnar format of the file `path` from its extension, or None for other files (and file objects) """
+    if not isinstance(path, basestring):
+        return None
+    return FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.feather
+    except ImportError:
+        raise ImportError('reading Parquet, Feather and Arrow files needs the `pyarrow` package')
+    return pyarrow
+
+
+def column_names(path):
+    """ the names of the columns in the file `path`, read from its schema """
+    pa = _pyarrow()
+    if format_of(path) == 'parquet':
+        return list(pa.parquet.ParquetFile(path).schema.names)
+    return list(pa.ipc.open_file(pa.memory_map(path)).schema.names)
+
+
+def read(path, columns=None, date_col=None, start=None, end=None, date_fmt=None, chunksize=None):
+    """
+    Reads the Parquet, Feather or Arrow file `path` into a pandas.DataFrame.
+    Args:
+        columns   (list) : names of the columns to read, defaults to all of them
+        date_col  (str)  : name of the date column, needed to skip row groups by date
+        start     (datetime) : skip the Parquet row groups which end before this date
+        end       (datetime) : skip the Parquet row groups which start after this date
+        date_fmt  (str)  : format of the dates when the date column holds strings, which is
+                           needed to compare their statistics.  Without it the row groups of
+                           string dates are all read
+        chunksize (int)  : return an iterator over DataFrames of at most this many rows instead,
+                           holding one row group (or record batch) in memory at a time
+    """
+    tables = _tables(path, columns, date_col, start, end, date_fmt)
+    if chunksize:
+        return _chunks(tables, chunksize)
+    tables = list(tables)
+    if not tables:
+        # every row group was skipped, an empty frame with the right columns
+        names = columns if columns is not None else column_names(path)
+        return pd.DataFrame(columns=names)
+    if len(tables) == 1:
+        return tables[0].to_pandas()
+    return _pyarrow().concat_tables(tables).to_pandas()
+
+
+def between(df, date_col, start=None, end=None):
+    """ returns the rows of `df` whose parsed `date_col` lies in [start, end], either end being optional """
+    mask = None
+    if start is not None:
+        mask = df[date_col] >= start
+    if end is not None:
+        mask = (df[date_col] <= end) if mask is None else mask & (df[date_col] <= end)
+    return df if mask is None else df[mask.values]
+
+
+def _tables(path, columns, date_col, start, end, date_fmt):
+    """ yields the pyarrow Tables of the row groups of `path` which may hold rows in [start, end] """
+    pa = _pyarrow()
+    if format_of(path) != 'parquet':
+        table = pa.feather.read_table(path, columns=columns)
+        for batch in table.to_batches():
+            yield pa.Table.from_batches([batch])
+        return
+    parquet = pa.parquet.ParquetFile(path)
+    groups = range(parquet.num_row_groups)
+    if date_col is not None and (start is not None or end is not None):
+        groups = [i for i in groups if _may_overlap(parquet.metadata.row_group(i), date_col, start, end, date_fmt)]
+        logger.debug('reading %d of %d row groups of %s', len(groups), parquet.num_row_groups, path)
+    for i in groups:
+        yield parquet.read_row_group(i, columns=columns)
+
+
+def _chunks(tables, chunksize):
+    for table in tables:
+        df = table.to_pandas()
+        for i in range(0, len(df), chunksize):
+            yield df.iloc[i:i + chunksize]
+
+
+def _may_overlap(row_group, date_col, start, end, date_fmt):
+    """ False only if the statistics of `date_col` in `row_group` show that all its dates are outside [start, end] """
+    for i in range(row_group.num_columns):
+        column = row_group.column(i)
+        if column.path_in_schema != date_col:
+            continue
+        stats = column.statistics
+        if stats is None or not stats.has_min_max:
+            return True
+        try:
+            low, high = _timestamp(stats.min, date_fmt), _timestamp(stats.max, date_fmt)
+            if start is not None and high < start:
+                return False
+            if end is not None and low > end:
+                return False
+        except (TypeError, ValueError):
+            # statistics which can't be compared as dates (e.g. integers), so the group is read
+            pass
+        return True
+    return True
+
+
+def _timestamp(value, date_fmt):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if isinstance(value, basestring):
+        if date_fmt is None:
+            raise ValueError('no date format to parse %r with' % value)
+        return pd.Timestamp(datetime.datetime.strptime(value, date_fmt))
+    if isinstance(value, (datetime.date, datetime.datetime, pd.Timestamp)):
+        return pd.Timestamp(value)
+    raise TypeError('not a date: %r' % (value,))
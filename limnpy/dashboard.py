@@ -1,4 +1,4 @@
-import csv, yaml, json
+import csv, json
 import os, logging
 import datetime
 from operator import itemgetter
@@ -6,10 +6,11 @@ from collections import Sequence, MutableSequence
 import codecs
 #import colorbrewer
 import itertools
-import pandas as pd
 import pprint
 import copy
 
+from output import default_output
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -44,13 +45,18 @@ class Dashboard(object):
         tab = [tab for tab in self.dashboard['tabs'] if tab['name'] == tab_name][0]
         tab['graph_ids'].append(graph.graph['slug'])
 
-    def write(self, basedir='.'):
+    def write(self, basedir='.', output=None):
+        output = output if output is not None else default_output
         db_dir = os.path.join(basedir, 'dashboards')
-        if not os.path.exists(db_dir):
-            os.makedirs(db_dir)
+        output.makedirs(db_dir)
 
         db_path = os.path.join(db_dir, self.id + '.json')
-        json.dump(self.dashboard, open(db_path, 'w'), indent=2)
+        output.write(db_path, json.dumps(self.dashboard, indent=2))
+
+    def write_async(self, basedir='.', executor=None, **kwargs):
+        """ writes the dashboard on `executor` and returns a concurrent.futures.Future, see limnpy.aio.write_async """
+        import aio
+        return aio.write_async(self, basedir, executor=executor, **kwargs)
 
     def __str__(self):
         return json.dumps(self.dashboard, indent=2)
@@ -0,0 +1,138 @@
+import json
+import gzip
+import logging
+import numpy as np
+import pandas as pd
+from StringIO import StringIO
+
+from dates import format_dates
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _rounded(df, float_precision):
+    """
+    returns `df` with its float columns rounded to `float_precision` decimal places.  The rounding
+    is done in float64, a rounded float32 (e.g. from DataSource.downcast) isn't the nearest value
+    to the decimal and would be written with more digits rather than fewer
+
+        >>> df = pd.DataFrame({'x' : np.array([1.25, 0.1], dtype=np.float32)})
+        >>> _rounded(df, 1)['x'].tolist()
+        [1.2, 0.1]
+    """
+    if float_precision is None:
+        return df
+    float_cols = [col for col in df.columns if df[col].dtype.kind == 'f']
+    if not float_cols:
+        return df
+    # a real copy, assigning columns of a shallow copy can write through to `df`
+    out = df.copy()
+    for col in float_cols:
+        out[col] = np.round(df[col].values.astype(np.float64), float_precision)
+    return out
+
+
+def _shortest_float64(values):
+    """
+    converts the float32 array `values` to the float64s of their shortest decimal representations
+    rather than the float64s exactly equal to them, which have a long tail of digits.  Every
+    float32 round trips through 9 significant digits, so at most 6 to 9 are tried
+
+        >>> _shortest_float64(np.array([0.1, 1.25, np.nan], dtype=np.float32)).tolist()[:2]
+        [0.1, 1.25]
+    """
+    out = values.astype(np.float64)
+    todo = np.isfinite(values)
+    for digits in range(6, 10):
+        if not todo.any():
+            break
+        candidates = np.char.mod('%%.%dg' % digits, values[todo]).astype(np.float64)
+        exact = candidates.astype(np.float32) == values[todo]
+        indices = np.flatnonzero(todo)[exact]
+        out[indices] = candidates[exact]
+        todo[indices] = False
+    return out
+
+
+def to_csv(df, date_fmt, buf=None, float_precision=None, **kwargs):
+    """
+    Serializes the datetime indexed `df` as a limn csv datafile, with the dates formatted by
+    `date_fmt`.  The dates are formatted into a shallow copy so `df` keeps its DatetimeIndex.
+    With `float_precision`, floats are rounded to that many decimal places and written without
+    trailing zeros.  Writes to `buf` if given, otherwise returns the csv as a str
+    """
+    out = _rounded(df, float_precision).copy(deep=False)
+    out.index = format_dates(df.index, date_fmt)
+    if float_precision is not None:
+        kwargs['float_format'] = '%.15g'
+    if buf is not None:
+        out.to_csv(buf, index_label='date', encoding='utf-8', **kwargs)
+        return
+    buf = StringIO()
+    out.to_csv(buf, index_label='date', encoding='utf-8', **kwargs)
+    return buf.getvalue()
+
+
+def to_json(df, date_fmt, float_precision=None):
+    """
+    Serializes the datetime indexed `df` as a compact columnar JSON datafile:
+
+        {"columns":["date","x"],"data":[["2012/09/01","2012/10/01"],[1,7]]}
+
+    with missing values written as null
+    """
+    df = _rounded(df, float_precision)
+    columns = ['date'] + ['%s' % col for col in df.columns]
+    data = [list(format_dates(df.index, date_fmt))]
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == np.float32:
+            values = pd.Series(_shortest_float64(values.values), index=values.index)
+        if values.isnull().any():
+            values = values.astype(object).where(values.notnull(), None)
+        data.append(values.tolist())
+    return json.dumps({'columns' : columns, 'data' : data}, separators=(',', ':'))
+
+
+def read_csv(path):
+    """ reads a csv datafile into a DataFrame indexed by its (unparsed) dates """
+    return pd.read_csv(path, index_col=0, encoding='utf-8')
+
+
+def read_json(path):
+    """ reads a datafile written by to_json into a DataFrame indexed by its (unparsed) dates """
+    with open(path) as f:
+        content = json.load(f)
+    labels, data = content['columns'], content['data']
+    return pd.DataFrame(dict(zip(labels[1:], data[1:])), index=pd.Index(data[0], name=labels[0]), columns=labels[1:])
+
+
+def gzipped(content):
+    """ returns `content` gzip compressed, with a fixed header so that the same input gives the same bytes """
+    buf = StringIO()
+    gz_f = gzip.GzipFile(filename='', mode='wb', fileobj=buf, mtime=0)
+    gz_f.write(content)
+    gz_f.close()
+    return buf.getvalue()
+
+
+# maps the datasource `format` to (datafile extension, serializer).  serializers take
+# the datetime indexed DataFrame, the date format and the float precision and return a str
+WRITERS = {
+    'csv' : ('.csv', to_csv),
+    'json' : ('.json', to_json),
+}
+
+# maps the datasource `format` to a function reading a datafile path, used by DataSource.load() handles
+READERS = {
+    'csv' : read_csv,
+    'json' : read_json,
+}
+
+
+def register(format, extension, writer, reader=None):
+    """ adds a datafile writer (and optionally reader) for the datasource format `format`, see WRITERS and READERS """
+    WRITERS[format] = (extension, writer)
+    if reader is not None:
+        READERS[format] = reader
@@ -1,4 +1,4 @@
-import csv, yaml, json
+import csv, json
 import os, logging
 import datetime
 from operator import itemgetter
@@ -7,10 +7,19 @@ import codecs
 #import colorbrewer
 import itertools
 import pandas as pd
+import numpy as np
 import pprint
 import copy
+from copy import deepcopy
+from StringIO import StringIO
 
 from graph import Graph
+from dates import parse_dates, DateParser
+from output import default_output
+import datafile
+import dictwriter
+import dtypes
+import instrument
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -63,26 +72,45 @@ class DataSource(object):
         >>> hash(open('doctest_tmp/datasources/test_source.yaml').read())
         -6541337400615626104
 
+        appending rows which overlap the datafile replaces the overlapping dates
+
+        >>> limnpy.DataSource('appended', 'Appended', rows).write(basedir='doctest_tmp')
+        >>> rows = {'date' : [datetime.date(2012, 10, 1), datetime.date(2012, 11, 1)], 'x' : [8, 3], 'y' : [10, 4]}
+        >>> limnpy.DataSource('appended', 'Appended', rows).write(basedir='doctest_tmp', append=True)
+        >>> print open('doctest_tmp/datafiles/appended.csv').read().rstrip()
+        date,x,y
+        2012/09/01,1,2
+        2012/10/01,8,10
+        2012/11/01,3,4
+
+        appending a new column rewrites the whole datafile with the extra column, keeping int columns ints
+
+        >>> rows = {'date' : [datetime.date(2012, 12, 1)], 'x' : [5], 'z' : [6]}
+        >>> limnpy.DataSource('appended', 'Appended', rows).write(basedir='doctest_tmp', append=True)
+        >>> print open('doctest_tmp/datafiles/appended.csv').read().rstrip()
+        date,x,y,z
+        2012/09/01,1,2,
+        2012/10/01,8,10,
+        2012/11/01,3,4,
+        2012/12/01,5,,6
+        >>> [col['label'] for col in json.load(open('doctest_tmp/datasources/appended.json'))['columns']]
+        [u'date', u'x', u'y', u'z']
+
+        appending to a datafile without a trailing newline doesn't join the last row and the new one
+
+        >>> content = open('doctest_tmp/datafiles/appended.csv').read().rstrip('\\n')
+        >>> open('doctest_tmp/datafiles/appended.csv', 'w').write(content)
+        >>> rows = {'date' : [datetime.date(2013, 1, 1)], 'x' : [2], 'y' : [1], 'z' : [0]}
+        >>> limnpy.DataSource('appended', 'Appended', rows).write(basedir='doctest_tmp', append=True)
+        >>> open('doctest_tmp/datafiles/appended.csv').read().splitlines()[-2:]
+        ['2012/12/01,5,,6', '2013/01/01,2,1,0']
+
     """
 
-    default_source = {
-        'id' : None,
-        'slug' : None,
-        'format' : 'csv',
-        'type' : 'timeseries',
-        'url' : None,
-        'name' : '',
-        'shortName' : '',
-        'desc' : '',
-        'notes' : '',
-        'columns' : [],
-        'timespan' : {
-            'start' : None,
-            'end' : None,
-            'step' : '1d'
-        }
-    }
-    
+    # the datasource template and default date format are shared with the pandas free DictWriter
+    default_source = dictwriter.default_source
+    default_date_fmt = dictwriter.default_date_fmt
+
     def __init__(self,
             limn_id,
             limn_name,
@@ -92,7 +120,9 @@ class DataSource(object):
             labels=None,
             types=None,
             date_key='date',
-            date_fmt='%Y/%m/%d'):
+            date_fmt=default_date_fmt,
+            copy=True,
+            downcast=False):
         """
         Constructs a Python representation of Limn (github.com/wikimedia/limn) datasource
         including both the metadata JSON (optionally YAML) file (known as a datasource) and the associated csv
@@ -115,15 +145,25 @@ class DataSource(object):
             labels    (list)      : the labels corresponding to the data "columns".  Not required
                                     if the data object
             types     (list)      : the javascript/limn types associated with each column of the csv file
-                                    mostly this just means `int` and `date`
+                                    (`date`, `int`, `float` or `string`).  Inferred from the data by default
             date_key  (str)       : name of the column to be used as the date column.  Defaults to 'date'
             date_fmt  (str)       : date format of the date column.
+            copy      (bool)      : whether to deep copy `data` before using it (the default).  With
+                                    copy=False a pandas.DataFrame is borrowed: `self.data` is a shallow
+                                    copy which shares the caller's column arrays, and setting the date
+                                    index or sorting only replaces the index or the arrays being
+                                    reordered.  Other inputs (e.g. a dict of numpy arrays) are handed
+                                    straight to the pandas.DataFrame constructor without the deepcopy.
+                                    Modifying the values in `self.data` in place will then modify the
+                                    caller's data as well
+            downcast  (bool)      : store each column in the smallest dtype which holds its values
+                                    exactly, see DataSource.downcast()
         """
 
         self.date_key = date_key
         self.date_fmt = date_fmt
         self.types = types
-        self.source = copy.deepcopy(DataSource.default_source)
+        self.source = deepcopy(DataSource.default_source)
         self.source['id'] = limn_id
         self.source['name'] = limn_name
         self.source['shortName'] = limn_name
@@ -132,7 +172,13 @@ class DataSource(object):
         # NOTE: though we construct the data member here, we allow the possibility
         # that it will change before we write, so all derived fields get set in infer() which is called by write()
         try:
-            self.data = pd.DataFrame(copy.deepcopy(data))
+            if not copy:
+                if isinstance(data, pd.DataFrame):
+                    self.data = data.copy(deep=False)
+                else:
+                    self.data = pd.DataFrame(data, copy=False)
+            else:
+                self.data = pd.DataFrame(deepcopy(data))
         except:
             raise ValueError('Error constructing DataFrame from data: %s.  See pandas.DataFrame documentation for help' % data)
         # check whether columns are not named or the labels field has been passed in
@@ -155,76 +201,450 @@ class DataSource(object):
             except:
                 logger.exception('error resetting index because self.data.columns=%s', self.data.columns)
                 raise ValueError('could not set_index because self.data.columns=%s', self.data.columns)
+        if downcast:
+            self.downcast()
         self.infer() # can't hurt to infer now. this way we can make graphs before writing the datasource
 
 
-    def infer(self):
+    @classmethod
+    def load(cls, basedir, limn_id):
+        """
+        Constructs a lightweight DataSource from an existing datasource in {basedir}/datasources
+        by reading only its JSON metadata.  The datafile in {basedir}/datafiles is not read until
+        the `data` attribute is first accessed, so these handles can be passed to limnpy.Graph
+        (which only needs the `source` metadata) to build graphs and dashboards without touching
+        any datafiles.
+        Args:
+            basedir  (str) : the directory containing the datasources and datafiles directories
+            limn_id  (str) : the id of the datasource to load
+        """
+        ds_path = os.path.join(basedir, 'datasources', limn_id + '.json')
+        source = deepcopy(DataSource.default_source)
+        source.update(json.load(open(ds_path)))
+
+        ds = cls.__new__(cls)
+        ds.source = source
+        ds.date_key = 'date'
+        # the column types are in source['columns'], and left to infer() for columns which are added or changed
+        ds.types = None
+        timespan = [source['timespan'][key] for key in ('start', 'end') if source['timespan'].get(key)]
+        ds.date_fmt = DateParser(formats=[DataSource.default_date_fmt]).infer_format(timespan) or DataSource.default_date_fmt
+        ds._data = None
+        ds._format = source.get('format') or 'csv'
+        if ds._format not in datafile.WRITERS:
+            raise ValueError('unknown datafile format %s of datasource %s, see limnpy.datafile.register' % (ds._format, limn_id))
+        ds._datafile = os.path.join(basedir, 'datafiles', limn_id + datafile.WRITERS[ds._format][0])
+        ds._manifest = None
+        if source.get('shards'):
+            ds._manifest = os.path.join(basedir, 'datafiles', limn_id + '.shards.json')
+        return ds
+
+
+    @classmethod
+    def from_columnar(cls, limn_id, limn_name, path, columns=None, start=None, end=None,
+            date_key='date', date_fmt=default_date_fmt, **kwargs):
+        """
+        Constructs a DataSource from a Parquet, Feather or Arrow file without parsing any text.
+        Only the date column and `columns` are read, and with `start` and/or `end` only the rows
+        in that (inclusive) date range are kept, skipping whole Parquet row groups outside of it.
+        See limnpy.columnar
+        Args:
+            path      (str)  : the .parquet, .pq, .feather, .arrow or .ipc file to read
+            columns   (list) : names of the value columns to read, defaults to all of them
+            start     (str|datetime) : earliest date to keep
+            end       (str|datetime) : latest date to keep
+            date_key  (str)  : name of the date column in the file
+            date_fmt  (str)  : format of the dates, used to parse a date column of strings
+        Other kwargs are passed on to the DataSource constructor
+        """
+        import columnar
+        if columnar.format_of(path) is None:
+            raise ValueError('not a Parquet, Feather or Arrow file: %s' % path)
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        names = [date_key] + [col for col in columns if col != date_key] if columns is not None else None
+        df = columnar.read(path, names, date_key, start, end, date_fmt)
+        df[date_key] = parse_dates(df[date_key], formats=[date_fmt])
+        df = columnar.between(df, date_key, start, end)
+        return cls(limn_id, limn_name, df, date_key=date_key, date_fmt=date_fmt, copy=False, **kwargs)
+
+
+    @property
+    def data(self):
+        """ the pandas.DataFrame holding the datafile contents, read on first access for DataSource.load() handles (from all of its shards, if it was written sharded) """
+        if self._data is None and getattr(self, '_datafile', None) is not None:
+            logger.debug('lazily loading datafile: %s', self._datafile)
+            reader = datafile.READERS.get(self._format)
+            if reader is None:
+                raise ValueError('no reader registered for the %s datafile %s' % (self._format, self._datafile))
+            manifest = getattr(self, '_manifest', None)
+            if manifest is not None:
+                shard_dir = manifest[:-len('.shards.json')]
+                shards = json.load(open(manifest))['shards']
+                df = pd.concat([reader(os.path.join(shard_dir, entry['name'] + '.csv')) for entry in shards])
+            else:
+                df = reader(self._datafile)
+            df.index = parse_dates(df.index, date_fmt=self.date_fmt)
+            self._data = df
+            # the metadata came from the datasource JSON written alongside this datafile, unless it
+            # describes only the latest shard, see _write_shards
+            if manifest is None:
+                self._inferred = self._fingerprint()
+        return self._data
+
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+
+    def _fingerprint(self):
+        """
+        Cheap summary of everything infer() depends on.  The data and index objects and the
+        arrays holding the columns are compared by identity; pandas replaces the index object
+        whenever rows are added, removed or re-labeled, and a column's array whenever the column
+        is rebuilt rather than written into, so this doesn't need to look at the values
+        themselves.  Values written into the existing arrays aren't noticed, see infer()
+        """
+        types = list(self.types) if self.types else None
+        arrays = [block.values for block in self.data._data.blocks]
+        return (self.data, self.data.index, arrays, list(self.data.columns), list(self.data.dtypes), types, self.date_fmt)
+
+
+    def _is_dirty(self):
+        """
+        whether infer() has to run again, see _fingerprint
+
+            >>> import datetime
+            >>> ds = DataSource('t', 'T', {'date' : [datetime.date(2012, 9, 1)], 'x' : [3]})
+            >>> ds._is_dirty()
+            False
+            >>> ds.data['x'] = ds.data['x'] / 2 # a new float64 array
+            >>> ds._is_dirty()
+            True
+            >>> ds.infer()
+            >>> ds.source['columns'][1]['type']
+            'float'
+
+        but float64 values written into the existing float64 array need infer(force=True)
+
+            >>> ds.data['x'] = ds.data['x'] * 2
+            >>> ds._is_dirty()
+            False
+            >>> ds.infer(force=True)
+            >>> ds.source['columns'][1]['type']
+            'int'
+        """
+        if self._data is None:
+            # a DataSource.load() handle whose datafile hasn't been read, so the metadata is current
+            return False
+        last = getattr(self, '_inferred', None)
+        if last is None:
+            return True
+        current = self._fingerprint()
+        same = lambda a, b : len(a) == len(b) and all(x is y for x, y in zip(a, b))
+        return not (last[0] is current[0] and last[1] is current[1] and same(last[2], current[2])
+                    and last[3:] == current[3:])
+
+
+    def downcast(self, categorical=0.5):
+        """
+        Replaces `self.data` with a copy whose columns are stored in the smallest dtypes which
+        hold their values exactly: int32 and float32 where the values fit, numbers rather than
+        numeric strings, and pandas categoricals for repetitive string columns (fewer than
+        `categorical` distinct values per row).  This roughly halves the memory of typical wide
+        sources and speeds up writing them.  The caller's data is never modified
+        """
+        self.data = dtypes.downcast(self.data, categorical)
+
+
+    def infer(self, force=False):
         """
         Infers the required metadata from the data if possible.  This is distinct
         from the __init__ routine so that the user can change the data after constructing
-        it and the meta data will accurately reflect any added data
-        """
-        # parse dates, sort, and format
-        # logger.debug('entering infer with self.data:\n%s', self.data)
-        self.data.index = pd.to_datetime(self.data.index)
-        # logger.debug('converted index to timestamps.  self.data.index:\n%s', self.data.index)
-        # logger.debug('id: %s', self.source['id'])
-        # logger.debug('set index to be a datetime index. type(self.data.index) = %s', type(self.data.index))
-        # logger.debug('id(self) = %s', id(self))
-        self.data.sort()
-        # logger.debug('columns: %s', self.data.columns)
-        # logger.debug('reverse columns: %s', list(reversed(self.data.sum().argsort(order=True))))
-        # self.data = self.data[self.data.columns[list(reversed(self.data.sum().argsort(order=True)))]]
-        logger.debug('self.data:\n%s', self.data)
-        # self.data = self.data.fillna(0) # leaving the NAs in until writing is better so that we can just write ''
-
-        # fill in data dependent keys
-        labels = ['date'] + list(self.data.columns)
-        types = self.types if self.types else ['date'] + ['int'] * len(self.data.columns)
-        self.source['columns'] = [{'label':flabel, 'type':ftype} for flabel, ftype in zip(labels, types)]
-        str_ind = self.data.index.astype(pd.lib.Timestamp).map(lambda ts : ts.strftime(self.date_fmt))
-        if len(str_ind) > 0:
-            self.source['timespan']['start'] = str_ind[0]
-            self.source['timespan']['end'] = str_ind[-1]
+        it and the meta data will accurately reflect any added data.  The work is skipped
+        when `data`, `types` and `date_fmt` have not changed since the last call unless
+        `force` is True.  Use force=True after modifying the values of the index in place, or
+        assigning new values of the same dtype to a column (e.g. `ds.data['x'] = ds.data['x'] / 3`),
+        which pandas writes into the existing arrays, since the type of a float column of whole
+        numbers is `int`
+        """
+        if not force and not self._is_dirty():
+            logger.debug('skipping infer for %s, nothing changed', self.source['id'])
+            return
+        with instrument.stage('datasource.infer', rows=len(self.data)):
+            # parse dates, sort, and format
+            # logger.debug('entering infer with self.data:\n%s', self.data)
+            if not isinstance(self.data.index, pd.DatetimeIndex):
+                # e.g. a column of date strings, each distinct string is parsed once, trying date_fmt first
+                self.data.index = parse_dates(self.data.index, formats=[self.date_fmt])
+            # logger.debug('converted index to timestamps.  self.data.index:\n%s', self.data.index)
+            # logger.debug('id: %s', self.source['id'])
+            # logger.debug('set index to be a datetime index. type(self.data.index) = %s', type(self.data.index))
+            # logger.debug('id(self) = %s', id(self))
+            if not self.data.index.is_monotonic:
+                self.data.sort_index(inplace=True)
+            # logger.debug('columns: %s', self.data.columns)
+            # logger.debug('reverse columns: %s', list(reversed(self.data.sum().argsort(order=True))))
+            # self.data = self.data[self.data.columns[list(reversed(self.data.sum().argsort(order=True)))]]
+            logger.debug('self.data:\n%s', self.data)
+            # self.data = self.data.fillna(0) # leaving the NAs in until writing is better so that we can just write ''
+
+            # fill in data dependent keys
+            labels = ['date'] + list(self.data.columns)
+            types = self.types if self.types else ['date'] + dtypes.infer_types(self.data)
+            self.source['columns'] = [{'label':flabel, 'type':ftype} for flabel, ftype in zip(labels, types)]
+            # the index is sorted above, so the timespan only needs the first and last dates formatted
+            if len(self.data.index) > 0:
+                self.source['timespan']['start'] = self.data.index[0].strftime(self.date_fmt)
+                self.source['timespan']['end'] = self.data.index[-1].strftime(self.date_fmt)
+            self._inferred = self._fingerprint()
         # logger.debug('exiting infer with self.data:\n%s', self.data)
 
 
-    def write(self, basedir='.'):
+    def write(self, basedir='.', append=False, output=None, shard=None, gzip=False, float_precision=None):
         """
         Infers metadata from data and writes datasource csv and YAML files
         to {basedir}/datasources and {basedir}/datafiles respectively
         Args:
             basedir (str) : specifies the directory in which to place the datasources
                             and datafiles directories
+            append  (bool): if an existing datafile and datasource are found in `basedir`,
+                            merge the rows in `self.data` into them instead of rewriting
+                            the whole datafile.  Existing rows with dates on or after the
+                            first new date are replaced, so the cost of the write scales
+                            with the number of new rows rather than the length of the history.
+                            The datafile is modified in place in this case rather than through `output`
+            output  (limnpy.output.Output) : used to write the files, skipping any whose contents
+                            haven't changed.  Defaults to limnpy.output.default_output
+            shard   (str) : if `year` or `month`, split the datafile into one csv per time range in
+                            {basedir}/datafiles/{id}/ and list them in {basedir}/datafiles/{id}.shards.json
+                            instead of writing {basedir}/datafiles/{id}.csv.  With append=True only
+                            the shards which the new rows fall into are read and rewritten
+            gzip    (bool): also write a gzip compressed copy of each datafile next to it (e.g.
+                            {id}.csv.gz), for static servers which serve precompressed files
+            float_precision (int) : round floats to this many decimal places in the datafile
+        The datafile format comes from `self.source['format']`, which can be any of the formats
+        in limnpy.datafile.WRITERS (`csv` or the columnar `json`).  Appending and sharding
+        only support csv datafiles.
         """
-        
-        self.infer()
-        self.data.index = self.data.index\
-                                           .astype(pd.lib.Timestamp)\
-                                           .map(lambda ts : ts.strftime(self.date_fmt))
+        output = output if output is not None else default_output
+        extension, writer = self._check_write(append, shard, gzip)
+        with instrument.stage('datasource.write', rows=len(self.data)):
+            self.infer()
 
-        # make dirs and write files
-        df_dir = os.path.join(basedir, 'datafiles')
-        #df_path = os.path.join(df_dir, self.limn_group, self.source['id'] + '.csv')
-        df_path = os.path.join(df_dir, self.source['id'] + '.csv')
-        logger.debug('writing datafile to: %s', df_path)
-        if not os.path.exists(df_dir):
-            os.makedirs(df_dir)
-        self.data.to_csv(df_path, index_label='date', encoding='utf-8')
+            # make dirs and write files
+            df_dir, df_path, ds_dir, ds_path = self._paths(basedir, extension)
+            logger.debug('writing datafile to: %s', df_path)
+            output.makedirs(df_dir)
+            if shard is not None:
+                self._write_shards(df_dir, ds_path, shard, append, output, gzip, float_precision)
+            elif append and os.path.exists(df_path) and os.path.exists(ds_path):
+                self._append_datafile(df_path, ds_path, output, float_precision)
+            else:
+                self._write_datafile(self.data, df_path, output, writer, gzip, float_precision)
+
+            logger.debug(pprint.pformat(self.source))
+
+            logger.debug('writing datasource to: %s', ds_path)
+            output.makedirs(ds_dir)
+            output.write(ds_path, json.dumps(self.source, indent=4))
+        self.wrote = True
+
+
+    def write_async(self, basedir='.', executor=None, **kwargs):
+        """
+        Like write(), but returns a concurrent.futures.Future straight away and does the work on
+        `executor` (defaults to limnpy.aio.default_executor()), see limnpy.aio.write_async
+        """
+        import aio
+        return aio.write_async(self, basedir, executor=executor, **kwargs)
+
+
+    def _check_write(self, append, shard, gzip):
+        """ validates the write() options, points the url at the right extension and returns the (extension, writer) to use """
+        if shard is not None and shard not in _shard_keys:
+            raise ValueError('shard must be one of %s, not: %s' % (sorted(_shard_keys), shard))
+        if self.source['format'] not in datafile.WRITERS:
+            raise ValueError('unknown datafile format: %s, must be one of %s' % (self.source['format'], sorted(datafile.WRITERS)))
+        if self.source['format'] != 'csv' and (append or shard):
+            raise ValueError('append and shard are only supported for csv datafiles, not: %s' % self.source['format'])
+        if gzip and append and shard is None:
+            raise ValueError('gzip is not supported when appending to a datafile in place')
+        extension, writer = datafile.WRITERS[self.source['format']]
+        if shard is None and self.source.get('shards'):
+            # previously written sharded, the url points at a shard rather than the whole datafile
+            self.source['url'] = _url_base(self.source) + extension
+            del self.source['shards']
+        if self.source['url'] and not self.source['url'].endswith(extension):
+            self.source['url'] = os.path.splitext(self.source['url'])[0] + extension
+        return extension, writer
 
-        logger.debug(pprint.pformat(self.source))
 
+    def _paths(self, basedir, extension):
+        """ returns the datafiles dir, datafile path, datasources dir and datasource path under `basedir` """
+        df_dir = os.path.join(basedir, 'datafiles')
+        #df_path = os.path.join(df_dir, self.limn_group, self.source['id'] + '.csv')
+        df_path = os.path.join(df_dir, self.source['id'] + extension)
         ds_dir = os.path.join(basedir, 'datasources')
         ds_path = os.path.join(ds_dir, self.source['id'] + '.json')
-        logger.debug('writing datasource to: %s', ds_path)
-        if not os.path.exists(ds_dir):
-            os.makedirs(ds_dir)
-        json_f = open(ds_path, 'w')
-
-        # the canonical=True arg keeps pyyaml from turning the str "y" (and others) into True
-        json.dump(self.source, json_f, indent=4)
-        json_f.close()
-        self.wrote = True
+        return df_dir, df_path, ds_dir, ds_path
+
+
+    def _write_datafile(self, df, df_path, output, writer, gzip=False, float_precision=None):
+        """ serializes `df` with `writer` and writes it to `df_path`, plus `df_path`.gz if `gzip` is set """
+        with instrument.stage('datafile.serialize', rows=len(df)):
+            content = writer(df, self.date_fmt, float_precision=float_precision)
+        with instrument.stage('datafile.write'):
+            output.write(df_path, content)
+            if gzip:
+                output.write(df_path + '.gz', datafile.gzipped(content))
+
+
+    def _write_shards(self, df_dir, ds_path, shard, append, output, gzip=False, float_precision=None):
+        """
+        Writes `self.data` as one csv per `shard` period plus a manifest listing each shard's
+        name, url, date range and row count.  The shard boundaries are found with vectorized
+        operations on the (sorted) DatetimeIndex.  When appending, existing shards which the new
+        rows fall into are merged with them (new values win) and all other shards are left alone.
+        Updates `self.source['columns']` to describe all of the shards.  limn reads a single
+        datafile, so the datasource `url` and `timespan` describe the latest shard, and the new
+        `shards` key points at the manifest, which has the `timespan` of the whole series and is
+        what consumers of the whole series should read
+        """
+        shard_dir = os.path.join(df_dir, self.source['id'])
+        manifest_path = os.path.join(df_dir, self.source['id'] + '.shards.json')
+        output.makedirs(shard_dir)
+        url_base = _url_base(self.source)
+
+        entries = {}
+        if append and os.path.exists(manifest_path):
+            entries = dict((entry['name'], entry) for entry in json.load(open(manifest_path))['shards'])
+        if append:
+            # shards on disk which a missing or stale manifest doesn't list
+            for fn in sorted(os.listdir(shard_dir)):
+                name, ext = os.path.splitext(fn)
+                if ext == '.csv' and name not in entries:
+                    old = pd.read_csv(os.path.join(shard_dir, fn), index_col=0, encoding='utf-8')
+                    if len(old) > 0:
+                        entries[name] = {'name' : name, 'url' : '%s/%s.csv' % (url_base, name),
+                                         'start' : old.index[0], 'end' : old.index[-1], 'rows' : len(old)}
+        if append and os.path.exists(ds_path):
+            old_columns = json.load(open(ds_path))['columns']
+            old_labels = [col['label'] for col in old_columns]
+            self.source['columns'] = old_columns + [col for col in self.source['columns'] if col['label'] not in old_labels]
+
+        keys = np.asarray(_shard_keys[shard](self.data.index))
+        bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        for start, end in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(keys)]])):
+            if start == end:
+                continue
+            name = _shard_names[shard](keys[start])
+            part = self.data.iloc[start:end]
+            shard_path = os.path.join(shard_dir, name + '.csv')
+            if append and os.path.exists(shard_path):
+                old = pd.read_csv(shard_path, index_col=0, encoding='utf-8')
+                old.index = parse_dates(old.index, date_fmt=self.date_fmt)
+                labels = list(old.columns) + [col for col in part.columns if col not in old.columns]
+                part = _restore_ints(part.combine_first(old).reindex(columns=labels), self.source['columns']).sort_index()
+            self._write_datafile(part, shard_path, output, datafile.to_csv, gzip, float_precision)
+            entries[name] = {
+                'name' : name,
+                'url' : '%s/%s.csv' % (url_base, name),
+                'start' : part.index[0].strftime(self.date_fmt),
+                'end' : part.index[-1].strftime(self.date_fmt),
+                'rows' : len(part),
+            }
+
+        shards = [entries[name] for name in sorted(entries)]
+        manifest = {'id' : self.source['id'], 'shard' : shard, 'shards' : shards}
+        if shards:
+            manifest['timespan'] = {'start' : shards[0]['start'], 'end' : shards[-1]['end']}
+        output.write(manifest_path, json.dumps(manifest, indent=4))
+        self.source['shards'] = url_base + '.shards.json'
+        if shards:
+            self.source['url'] = shards[-1]['url']
+            self.source['timespan']['start'] = shards[-1]['start']
+            self.source['timespan']['end'] = shards[-1]['end']
+
+
+    def _append_datafile(self, df_path, ds_path, output, float_precision=None):
+        """
+        Merges `self.data` into the existing datafile at `df_path`.  Only the tail of the file which overlaps
+        the new rows is read and rewritten.  If the new data has columns which the existing
+        datafile lacks, the header has to change so the whole file is rewritten instead.
+        Updates `self.source['columns']` and `self.source['timespan']` to describe the merged file.
+        """
+        old_source = json.load(open(ds_path))
+        old_labels = [col['label'] for col in old_source['columns']]
+        new_labels = ['date'] + list(self.data.columns)
+        parse = lambda s : datetime.datetime.strptime(s, self.date_fmt)
+
+        if len(self.data.index) == 0:
+            self.source['columns'] = old_source['columns']
+            self.source['timespan'] = old_source['timespan']
+            return
+
+        if set(new_labels) - set(old_labels):
+            logger.debug('new columns %s not in datafile %s, rewriting whole file',
+                    list(set(new_labels) - set(old_labels)), df_path)
+            old = pd.read_csv(df_path, index_col=0, encoding='utf-8')
+            columns = [col for col in old_source['columns']]
+            columns.extend([col for col in self.source['columns'] if col['label'] not in old_labels])
+            merged = self._merge_rows(old, columns)
+            self._write_datafile(merged, df_path, output, datafile.to_csv, float_precision=float_precision)
+            self.source['columns'] = columns
+            self.source['timespan']['start'] = merged.index[0].strftime(self.date_fmt)
+            self.source['timespan']['end'] = merged.index[-1].strftime(self.date_fmt)
+            return
+
+        df_f = open(df_path, 'r+b')
+        header = df_f.readline()
+        start = parse(self.data.index[0].strftime(self.date_fmt))
+        offset, tail_lines = _read_tail(df_f, len(header), start, parse)
+        tail = pd.read_csv(StringIO(header + ''.join(tail_lines)), index_col=0, encoding='utf-8')
+        merged = self._merge_rows(tail, old_source['columns'])
+        logger.debug('appending %d rows to %s at offset %d (replacing %d rows)',
+                len(merged), df_path, offset, len(tail_lines))
+        df_f.seek(offset)
+        df_f.truncate()
+        datafile.to_csv(merged, self.date_fmt, df_f, float_precision=float_precision, header=False)
+        df_f.close()
+
+        self.source['columns'] = old_source['columns']
+        if offset == len(header) or old_source['timespan']['start'] is None:
+            self.source['timespan']['start'] = merged.index[0].strftime(self.date_fmt)
+        else:
+            self.source['timespan']['start'] = old_source['timespan']['start']
+        self.source['timespan']['end'] = merged.index[-1].strftime(self.date_fmt)
+
+
+    def _merge_rows(self, old, columns):
+        """
+        Combines rows from `old` (indexed by date strings read from a datafile) with `self.data`,
+        preferring the values in `self.data` where dates overlap, and returns the merged frame
+        sorted by date with the columns described by the datasource `columns` (including the
+        date), keeping their `int` columns as ints, see _restore_ints
+        """
+        old.index = parse_dates(old.index, date_fmt=self.date_fmt)
+        merged = self.data.combine_first(old).reindex(columns=[col['label'] for col in columns[1:]])
+        return _restore_ints(merged, columns).sort_index()
+
+
+    def column_index(self):
+        """
+        Returns a dict mapping each column label to its position in `source['columns']` (which is
+        the `source_col` used by graph metrics).  The map is cached and rebuilt whenever
+        `source['columns']` is replaced, which infer() does each time it actually reruns
+        """
+        cols = self.source['columns']
+        cached = getattr(self, '_column_index', None)
+        if cached is None or cached[0] is not cols or cached[1] != len(cols):
+            index = {}
+            for i, col in enumerate(cols):
+                index.setdefault(col['label'], i)
+            self._column_index = (cols, len(cols), index)
+        return self._column_index[2]
 
 
     def __repr__(self):
@@ -239,7 +659,7 @@ class DataSource(object):
         """
         self.infer()
 
-        metric_ids = metric_ids if metric_ids else self.data.columns
+        metric_ids = metric_ids if metric_ids else [col['label'] for col in self.source['columns'][1:]]
         title = title if title else self.source['name']
         graph_id = graph_id if graph_id else self.source['id']
         g = Graph(graph_id, title)
@@ -260,3 +680,104 @@ class DataSource(object):
         g = self.get_graph(metric_ids, title=title, graph_id=graph_id)
         g.write(basedir)
         return g
+
+
+    def get_rollups(self, resolutions=('daily', 'weekly', 'monthly'), how='sum'):
+        """
+        Returns a dict mapping resolution names (`hourly`, `daily`, `weekly`, `monthly`) to
+        downsampled copies of this datasource, each with its own id, datafile and `timespan.step`.
+        See limnpy.rollup.rollups for details
+        Args:
+            resolutions (list)     : the resolutions to produce
+            how         (str|dict) : the aggregation to use for all columns or a dict mapping column labels
+                                     to aggregations (`sum`, `mean`, `min`, `max`, `first`, `last`, ...)
+        """
+        from rollup import rollups # rollup imports DataSource
+        return rollups(self, resolutions, how)
+
+
+# functions mapping a DatetimeIndex to an integer key per row for each kind of shard,
+# and formatting one of those keys as the shard name
+_shard_keys = {
+    'year' : lambda index : index.year,
+    'month' : lambda index : index.year * 100 + index.month,
+}
+_shard_names = {
+    'year' : lambda key : '%04d' % key,
+    'month' : lambda key : '%04d-%02d' % (key // 100, key % 100),
+}
+
+
+def _restore_ints(df, columns):
+    """
+    Merging frames with combine_first and reindex turns int columns into floats, which would be
+    written as `1.0` although the datasource `columns` still type them `int`.  Casts such columns
+    of `df` back to int64, or to objects holding ints where values are missing, which are written
+    as empty cells
+
+        >>> df = pd.DataFrame({'x' : [1.0, 2.0], 'y' : [3.0, np.nan], 'z' : [0.5, 1.0]})
+        >>> columns = [{'label' : 'date', 'type' : 'date'}, {'label' : 'x', 'type' : 'int'},
+        ...            {'label' : 'y', 'type' : 'int'}, {'label' : 'z', 'type' : 'float'}]
+        >>> print _restore_ints(df, columns).to_csv(index=False).strip()
+        x,y,z
+        1,3,0.5
+        2,,1.0
+    """
+    out = None
+    for col in columns[1:]:
+        label = col['label']
+        if col['type'] != 'int' or label not in df.columns or df[label].dtype.kind != 'f':
+            continue
+        values = df[label].values
+        present = ~np.isnan(values)
+        if not (values[present] == np.floor(values[present])).all():
+            continue
+        if out is None:
+            # a real copy, assigning columns of a shallow copy can write through to `df`
+            out = df.copy()
+        if present.all():
+            out[label] = values.astype(np.int64)
+        else:
+            ints = np.empty(len(values), dtype=object)
+            ints[present] = values[present].astype(np.int64)
+            ints[~present] = np.nan
+            out[label] = ints
+    return df if out is None else out
+
+
+def _url_base(source):
+    """ the url of the datafile of `source` without its extension, which its shards are listed and stored under """
+    if source.get('shards'):
+        return source['shards'][:-len('.shards.json')]
+    return os.path.splitext(source['url'])[0]
+
+
+def _read_tail(f, header_len, start, parse, block_size=1 << 16):
+    """
+    Scans the csv file object `f` backwards from the end and collects the lines whose
+    date (the first field, parsed with `parse`) is on or after `start`.  Stops as soon as
+    an earlier date or the header is reached, so only the overlapping tail is read.
+    Returns the byte offset of the first collected line along with the lines themselves.
+    """
+    f.seek(-1, os.SEEK_END)
+    if f.read(1) != '\n':
+        f.seek(0, os.SEEK_END)
+        f.write('\n')
+    f.seek(0, os.SEEK_END)
+    pos = cursor = f.tell() # cursor is the position just past the line being examined
+    lines = []
+    partial = ''
+    while pos > header_len:
+        read_len = min(block_size, pos - header_len)
+        pos -= read_len
+        f.seek(pos)
+        chunks = (f.read(read_len) + partial).split('\n')
+        # unless we have reached the header the first chunk may only be part of a line
+        partial = chunks.pop(0) if pos > header_len else ''
+        for line in reversed(chunks):
+            if line:
+                if parse(line.split(',', 1)[0].strip('"')) < start:
+                    return cursor + 1, lines[::-1]
+                lines.append(line + '\n')
+            cursor -= len(line) + 1
+    return header_len, lines[::-1]
@@ -0,0 +1,182 @@
+import re
+import logging
+import datetime
+import numbers
+import dateutil.parser
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+# strftime directives which can be built from the integer fields of a DatetimeIndex
+# mapped to (DatetimeIndex attribute, width)
+_fields = {
+    'Y' : ('year', 4),
+    'm' : ('month', 2),
+    'd' : ('day', 2),
+    'H' : ('hour', 2),
+    'M' : ('minute', 2),
+    'S' : ('second', 2),
+}
+
+_plans = {}
+
+# formats tried (in order) when inferring the format of a date column
+COMMON_FORMATS = [
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d_%H',
+    '%Y-%m-%d %H',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y/%m/%d %H:%M',
+    '%Y%m%d',
+    '%Y%m%d%H',
+    '%Y-%m',
+    '%m/%d/%Y',
+]
+
+_string_types = (type(''), type(u''))
+
+
+def _compile(date_fmt):
+    """
+    Splits `date_fmt` into a list of ('field', attr, width) and ('literal', str) parts,
+    or returns None if the format uses anything other than the numeric directives in `_fields`
+    """
+    if date_fmt in _plans:
+        return _plans[date_fmt]
+    plan = []
+    pos = 0
+    for match in re.finditer('%(.)', date_fmt):
+        if match.start() > pos:
+            plan.append(('literal', date_fmt[pos:match.start()]))
+        directive = match.group(1)
+        if directive not in _fields:
+            plan = None
+            break
+        plan.append(('field',) + _fields[directive])
+        pos = match.end()
+    if plan is not None and pos < len(date_fmt):
+        plan.append(('literal', date_fmt[pos:]))
+    if plan is not None and not all(all(ord(c) < 128 for c in part[1]) for part in plan if part[0] == 'literal'):
+        plan = None
+    _plans[date_fmt] = plan
+    return plan
+
+
+def format_dates(index, date_fmt):
+    """
+    Vectorized equivalent of `index.map(lambda ts : ts.strftime(date_fmt))` for a DatetimeIndex.
+    Formats built only out of %Y, %m, %d, %H, %M and %S (which covers `%Y/%m/%d`, `%Y-%m-%d`
+    and the usual hourly formats) are assembled digit by digit with numpy arithmetic into a fixed
+    width character array, anything else falls back to calling strftime on each timestamp.
+
+        >>> import pandas as pd
+        >>> list(format_dates(pd.date_range('2012-12-31 22:00', periods=3, freq='H'), '%Y-%m-%d_%H'))
+        ['2012-12-31_22', '2012-12-31_23', '2013-01-01_00']
+        >>> list(format_dates(pd.date_range('2012-09-01', periods=2, freq='D'), '%b %d %Y'))
+        ['Sep 01 2012', 'Sep 02 2012']
+    """
+    index = pd.DatetimeIndex(index)
+    plan = _compile(date_fmt)
+    if plan is None or len(index) == 0 or pd.isnull(index).any():
+        return pd.Index([ts.strftime(date_fmt) for ts in index], dtype=object)
+
+    width = sum(part[2] if part[0] == 'field' else len(part[1]) for part in plan)
+    chars = np.empty((len(index), width), dtype=np.uint8)
+    col = 0
+    for part in plan:
+        if part[0] == 'literal':
+            for c in part[1]:
+                chars[:, col] = ord(c)
+                col += 1
+        else:
+            values = np.asarray(getattr(index, part[1]), dtype=np.int64)
+            for power in range(part[2] - 1, -1, -1):
+                chars[:, col] = (values // 10 ** power) % 10 + ord('0')
+                col += 1
+    strs = chars.view('S%d' % width).ravel()
+    return pd.Index(strs.astype(str), dtype=object)
+
+
+class DateParser(object):
+    """
+    Parses columns of date strings into a DatetimeIndex.  Each distinct string is only ever
+    parsed once: the values are factorized, only the uniques which aren't already in the
+    memo cache are parsed, and the results are expanded back out by the factorized codes.
+    Unless `date_fmt` is given, the format is inferred once from a sample of the uniques by
+    trying `formats` followed by COMMON_FORMATS, after which whole batches are parsed with
+    pandas.to_datetime(format=...).  Strings which don't match fall back to dateutil.parser.parse.
+    The cache lives on the instance, so reusing one parser across chunks of the same input
+    means timestamps which repeat between chunks aren't parsed again.
+
+        >>> p = DateParser()
+        >>> [str(ts) for ts in p(['2013-01-01_00', '2013-01-01_01', '2013-01-01_00'])]
+        ['2013-01-01 00:00:00', '2013-01-01 01:00:00', '2013-01-01 00:00:00']
+        >>> p.date_fmt
+        '%Y-%m-%d_%H'
+    """
+
+    sample_size = 20
+
+    def __init__(self, date_fmt=None, formats=None):
+        self.date_fmt = date_fmt
+        self.formats = list(formats or []) + COMMON_FORMATS
+        self.cache = {}
+
+
+    def infer_format(self, sample):
+        """ returns the first candidate format which parses every string in `sample`, or None """
+        for fmt in self.formats:
+            try:
+                for s in sample:
+                    datetime.datetime.strptime(s, fmt)
+            except (ValueError, TypeError):
+                continue
+            return fmt
+        return None
+
+
+    def _parse(self, strs):
+        """ returns the int64 nanosecond timestamps for the list of strings `strs` """
+        if self.date_fmt is None:
+            self.date_fmt = self.infer_format(strs[:self.sample_size])
+            logger.debug('inferred date format: %s', self.date_fmt)
+        if self.date_fmt is not None:
+            try:
+                return pd.to_datetime(strs, format=self.date_fmt).asi8
+            except (ValueError, TypeError):
+                logger.debug('not all dates match %s, falling back to dateutil.parser.parse', self.date_fmt)
+        return np.array([pd.Timestamp(dateutil.parser.parse(s)).value for s in strs], dtype=np.int64)
+
+
+    def __call__(self, values):
+        """ parses the array-like `values` and returns a DatetimeIndex """
+        name = getattr(values, 'name', None)
+        values = np.asarray(values)
+        if values.dtype.kind == 'M':
+            return pd.DatetimeIndex(values, name=name)
+        codes, uniques = pd.factorize(values)
+        missing = [u for u in uniques if u not in self.cache]
+        if missing:
+            textual = [u for u in missing if isinstance(u, _string_types + (numbers.Integral,))]
+            others = [u for u in missing if not isinstance(u, _string_types + (numbers.Integral,))]
+            if textual:
+                strs = [u if isinstance(u, _string_types) else '%d' % u for u in textual]
+                self.cache.update(zip(textual, self._parse(strs)))
+            if others:
+                # datetime.date, datetime.datetime and friends, which pandas already understands
+                self.cache.update(zip(others, pd.to_datetime(others).asi8))
+        # missing values get code -1, which picks up the NaT on the end
+        parsed = np.array([self.cache[u] for u in uniques] + [pd.NaT.value], dtype=np.int64)
+        return pd.DatetimeIndex(parsed.take(codes).view('M8[ns]'), name=name)
+
+
+def parse_dates(values, date_fmt=None, formats=None):
+    """ parses `values` with a one-off DateParser, see DateParser for details """
+    return DateParser(date_fmt, formats)(values)
@@ -0,0 +1,262 @@
+import os, logging
+import csv, json
+import datetime
+import numbers
+from copy import deepcopy
+
+from output import default_output, _temp_file, _replace, _discard
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+default_source = {
+    'id' : None,
+    'slug' : None,
+    'format' : 'csv',
+    'type' : 'timeseries',
+    'url' : None,
+    'name' : '',
+    'shortName' : '',
+    'desc' : '',
+    'notes' : '',
+    'columns' : [],
+    'timespan' : {
+        'start' : None,
+        'end' : None,
+        'step' : '1d'
+    }
+}
+
+default_date_fmt = '%Y/%m/%d'
+
+# column types in the order they are widened to as values of each type are seen
+_type_order = ['int', 'float', 'string']
+
+
+class DictWriter(object):
+    """
+    Writes a limn datasource one row at a time, like csv.DictWriter.  Rows go through a small
+    buffer straight to the datafile while the timespan and the column types are kept as running
+    values, so datasources of any length can be written in constant memory, and without pandas.
+    The datafile is written to a temporary file which is renamed into place, and the datasource
+    JSON written, by close() (or at the end of a `with` block).  Rows should be written in date
+    order since they aren't sorted.
+
+        >>> import datetime
+        >>> writer = DictWriter('test_writer', 'Test Writer', keys=['date', 'x', 'y'], basedir='doctest_tmp_writer')
+        >>> writer.writerow({'date' : datetime.date(2012, 9, 1), 'x' : 1, 'y' : 2})
+        >>> writer.writerow({'date' : datetime.date(2012, 10, 1), 'x' : 7, 'y' : 9.5})
+        >>> writer.close()
+        >>> print open('doctest_tmp_writer/datafiles/test_writer.csv').read().strip()
+        date,x,y
+        2012/09/01,1,2
+        2012/10/01,7,9.5
+        >>> source = json.load(open('doctest_tmp_writer/datasources/test_writer.json'))
+        >>> [str(col['type']) for col in source['columns']], str(source['timespan']['end'])
+        (['date', 'int', 'float'], '2012/10/01')
+        >>> import shutil; shutil.rmtree('doctest_tmp_writer')
+    """
+
+    def __init__(self,
+            limn_id,
+            limn_name,
+            keys=None,
+            basedir='.',
+            limn_group='',
+            url=None,
+            types=None,
+            date_key='date',
+            date_fmt=default_date_fmt,
+            restval='',
+            extrasaction='raise',
+            buffer_rows=1000,
+            output=None):
+        """
+        Args:
+            limn_id   (str)  : the id used to uniquely identify this datasource in limn
+            limn_name (str)  : the name which will be displayed to users for this datasource
+        Kwargs:
+            keys      (list) : the keys of the row dicts to write, in column order.  The `date_key`
+                               column always comes first.  Defaults to the keys of the first row,
+                               with the others sorted
+            basedir   (str)  : the directory in which to place the datafiles and datasources directories
+            limn_group (str) : added to the default datafile url, as with DataSource
+            url       (str)  : custom url where the datafile will be available
+            types     (list) : the limn types of the columns, overriding the ones inferred from
+                               the values (`int`, `float` or `string`)
+            date_key  (str)  : the key of the date in each row.  Its values can be datetime.date or
+                               datetime.datetime objects or strings already in `date_fmt`
+            date_fmt  (str)  : date format of the date column
+            restval, extrasaction : what to write for missing keys and what to do with keys which
+                               aren't in `keys` (`raise` or `ignore`), as for csv.DictWriter
+            buffer_rows (int): number of rows to hold before writing them to the datafile
+            output    (limnpy.output.Output) : used to write the datasource JSON, skipping it
+                               if unchanged.  Defaults to limnpy.output.default_output
+        """
+        if extrasaction not in ('raise', 'ignore'):
+            raise ValueError("extrasaction must be 'raise' or 'ignore', not: %s" % extrasaction)
+        self.date_key = date_key
+        self.date_fmt = date_fmt
+        self.types = types
+        self.restval = restval
+        self.extrasaction = extrasaction
+        self.buffer_rows = buffer_rows
+        self.output = output if output is not None else default_output
+
+        self.source = deepcopy(default_source)
+        self.source['id'] = limn_id
+        self.source['name'] = limn_name
+        self.source['shortName'] = limn_name
+        self.source['url'] = url if url else os.path.join('/data/datafiles', limn_group, limn_id + '.csv')
+
+        self.rows = 0
+        self.start = None
+        self.end = None
+        self._last = None
+        self._col_types = None
+        self._buffer = []
+
+        self.df_path = os.path.join(basedir, 'datafiles', limn_id + '.csv')
+        self.ds_path = os.path.join(basedir, 'datasources', limn_id + '.json')
+        for path in (self.df_path, self.ds_path):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+        self._file = _temp_file(self.df_path)
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        self.closed = False
+        self.keys = None
+        if keys is not None:
+            self._set_keys(keys)
+
+
+    def _set_keys(self, keys):
+        if self.date_key not in keys:
+            self._discard()
+            raise ValueError('date_key: `%s` must be in keys: %s' % (self.date_key, list(keys)))
+        self.keys = [self.date_key] + [key for key in keys if key != self.date_key]
+        self._key_set = frozenset(self.keys)
+        self._col_types = [None] * (len(self.keys) - 1)
+        self._writer.writerow(['date'] + [_encode(key) for key in self.keys[1:]])
+
+
+    def writerow(self, row):
+        """ writes the dict `row`, updating the timespan and column types """
+        if self.closed:
+            raise ValueError('writerow on closed DictWriter: %s' % self.source['id'])
+        if self.keys is None:
+            self._set_keys(sorted(row))
+        if self.extrasaction == 'raise':
+            extras = [key for key in row if key not in self._key_set]
+            if extras:
+                raise ValueError('row has keys which are not in the DictWriter keys: %s' % extras)
+
+        date = self._date(row[self.date_key])
+        if self._last is not None and date < self._last:
+            logger.warning('%s: rows are not in date order, %s written after %s', self.source['id'], date, self._last)
+        self._last = date
+        if self.start is None or date < self.start:
+            self.start = date
+        if self.end is None or date > self.end:
+            self.end = date
+
+        line = [date.strftime(self.date_fmt)]
+        col_types = self._col_types
+        for i, key in enumerate(self.keys[1:]):
+            value = row.get(key, self.restval)
+            if value is None:
+                value = ''
+            elif isinstance(value, unicode):
+                value = _encode(value)
+            if col_types[i] != 'string' and value != '':
+                col_types[i] = _widen(col_types[i], value)
+            line.append(value)
+        self._buffer.append(line)
+        self.rows += 1
+        if len(self._buffer) >= self.buffer_rows:
+            self.flush()
+
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+
+    def flush(self):
+        """ writes the buffered rows to the (temporary) datafile """
+        self._writer.writerows(self._buffer)
+        self._buffer = []
+
+
+    def _date(self, value):
+        if isinstance(value, datetime.datetime):
+            return value
+        if isinstance(value, datetime.date):
+            return datetime.datetime(value.year, value.month, value.day)
+        return datetime.datetime.strptime(value, self.date_fmt)
+
+
+    def close(self):
+        """ finishes the datafile, renaming it into place, and writes the datasource JSON """
+        if self.closed:
+            return
+        if self.keys is None:
+            self._discard()
+            raise ValueError('no rows were written to DictWriter: %s' % self.source['id'])
+        try:
+            self.flush()
+            self._file.close()
+            _replace(self._file.name, self.df_path)
+        except:
+            self._discard()
+            raise
+        self.closed = True
+
+        col_types = [col_type or 'int' for col_type in self._col_types]
+        types = self.types if self.types else ['date'] + col_types
+        labels = ['date'] + list(self.keys[1:])
+        self.source['columns'] = [{'label':flabel, 'type':ftype} for flabel, ftype in zip(labels, types)]
+        if self.start is not None:
+            self.source['timespan']['start'] = self.start.strftime(self.date_fmt)
+            self.source['timespan']['end'] = self.end.strftime(self.date_fmt)
+        self.output.write(self.ds_path, json.dumps(self.source, indent=4))
+
+
+    def _discard(self):
+        """ abandons the temporary datafile, leaving any existing datafile in place """
+        self.closed = True
+        _discard(self._file)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self._discard()
+        else:
+            self.close()
+        return False
+
+
+    def __repr__(self):
+        return '<DictWriter %s rows=%d>' % (self.source['id'], self.rows)
+
+
+def _encode(value):
+    """ csv writes bytes, so unicode keys and values are written as utf-8 """
+    return value.encode('utf-8') if isinstance(value, unicode) else '%s' % value
+
+
+def _widen(col_type, value):
+    """ returns the narrowest of `col_type` and the types in _type_order which can hold `value` """
+    if isinstance(value, numbers.Integral):
+        value_type = 'int'
+    elif isinstance(value, numbers.Real):
+        value_type = 'float'
+    else:
+        value_type = 'string'
+    if col_type is None or _type_order.index(value_type) > _type_order.index(col_type):
+        return value_type
+    return col_type
@@ -0,0 +1,92 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_int32 = np.iinfo(np.int32)
+
+
+def column_type(values):
+    """
+    Returns the limn type of the column `values`: `int` when every non-missing value is a whole
+    number (including float columns which only hold whole numbers and NaNs, as produced by
+    pivoting or reindexing int data), `float` for other numbers and `string` for anything else.
+    The checks are done on the whole column at once rather than value by value
+
+        >>> column_type(pd.Series([1, 2, 3])), column_type(pd.Series([1.0, np.nan])), column_type(pd.Series([0.5]))
+        ('int', 'int', 'float')
+        >>> column_type(pd.Series(['a', 'b'])), column_type(pd.Series(['1', '2.5']))
+        ('string', 'float')
+    """
+    values = _numeric(values)
+    kind = values.dtype.kind
+    if kind in 'iub':
+        return 'int'
+    if kind == 'f':
+        finite = values.values[np.isfinite(values.values)]
+        return 'int' if (np.mod(finite, 1) == 0).all() else 'float'
+    return 'string'
+
+
+def infer_types(df):
+    """ returns the limn types of the columns of `df`, see column_type """
+    return [column_type(df[col]) for col in df.columns]
+
+
+def downcast(df, categorical=0.5):
+    """
+    Returns `df` with each column stored in the smallest dtype which holds its values exactly:
+    int64 columns which fit become int32, float64 columns whose values survive the round trip
+    become float32, object columns of numbers become numeric and other object columns with
+    fewer than `categorical` distinct values per row become pandas categoricals.  Columns which
+    can't be narrowed are left as they are, and `df` itself is never modified
+
+        >>> df = downcast(pd.DataFrame({'i' : [1, 2, 3], 'f' : [0.5, 1.5, 2.5], 'p' : [0.1, 0.2, 0.3], 's' : ['a', 'a', 'a']}))
+        >>> [str(df[col].dtype) for col in ['i', 'f', 'p', 's']]
+        ['int32', 'float32', 'float64', 'category']
+    """
+    columns = []
+    changed = False
+    for col in df.columns:
+        values = df[col]
+        narrowed = _narrow(_numeric(values), categorical)
+        if narrowed is not values:
+            logger.debug('downcasting column %s from %s to %s', col, values.dtype, narrowed.dtype)
+            changed = True
+        columns.append(narrowed)
+    if not changed:
+        return df
+    # a new frame rather than assigning into a copy, which pandas may cast back into the old blocks
+    out = pd.concat(columns, axis=1)
+    out.columns = df.columns
+    return out
+
+
+def _numeric(values):
+    """ converts an object column of numbers (e.g. numeric strings) to a numeric one, otherwise returns it unchanged """
+    if values.dtype != object:
+        return values
+    converted = pd.to_numeric(values, errors='coerce')
+    if converted.notnull().sum() == values.notnull().sum():
+        return converted
+    return values
+
+
+def _narrow(values, categorical):
+    kind = values.dtype.kind
+    if kind == 'i' and values.dtype.itemsize > 4:
+        if len(values) == 0 or (values.min() >= _int32.min and values.max() <= _int32.max):
+            return values.astype(np.int32)
+    elif kind == 'f' and values.dtype.itemsize > 4:
+        narrow = values.values.astype(np.float32)
+        # exact round trips only, NaNs compare unequal so they are matched up separately
+        wide = narrow.astype(values.dtype)
+        nan = np.isnan(values.values)
+        if ((wide == values.values) | (nan & np.isnan(wide))).all():
+            return pd.Series(narrow, index=values.index, name=values.name)
+    elif kind == 'O' and len(values) > 0:
+        if values.nunique() < categorical * len(values):
+            return values.astype('category')
+    return values
@@ -1,4 +1,4 @@
-import csv, yaml, json
+import csv, json
 import os, logging
 import datetime
 from operator import itemgetter
@@ -6,10 +6,12 @@ from collections import Sequence, MutableSequence
 import codecs
 #import colorbrewer
 import itertools
-import pandas as pd
 import pprint
 import copy
 
+from output import default_output
+import instrument
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -55,7 +57,9 @@ class Graph(object):
         Args:
             id         (str)   : graph id which uniquely identifies this graph for use in dashboards and such
             title      (str)   : title which will be displayed above graph
-            sources    (list)  : list of limnpy.DataSource objects from which to construct the graph
+            sources    (list)  : list of limnpy.DataSource objects from which to construct the graph.
+                                 only their metadata is used, so DataSource.load() handles work without
+                                 reading any datafiles
         Kwargs:
             metric_ids (list)  : list of tuples (datasource_id, column_name) to plot if None will
                                  plot all of the columns from all of the datasources
@@ -72,21 +76,18 @@ class Graph(object):
         else:
             self.graph['slug'] = slug
 
-        # construct metric_ids list of tuples for all metrics and all sources
+        # plot all metrics from all sources
         if metric_ids is None:
-            metric_ids = []
             for source in sources:
-                labels = set([col['label'] for col in source.source['columns']]) - set(['date'])
-                source_id_repeat = itertools.repeat(source.source['id'])
-                metric_ids.extend(zip(source_id_repeat,labels))
+                self.add_metrics(source, [col['label'] for col in source.source['columns'] if col['label'] != 'date'])
+            return
 
         source_dict = {source.source['id'] : source for source in sources}
         for source_id, col_key in metric_ids:
             source = source_dict[source_id]
-            try:
-                self.add_metric(source, col_key)
-            except ValueError:
+            if col_key not in source.column_index():
                 logger.warning('Could not find column label: %s in datasource: %s', col_key, source.source['id'])
+            self.add_metric(source, col_key)
     
     
     def add_metric(self, source, col_key, label=None, color=None):
@@ -94,38 +95,60 @@ class Graph(object):
         Adds a line, or metric, to the graph object corresponding 
         to the column `col_key` in the datasource`
         """
-        try:
-            col_idx = [i for (i, col) in enumerate(source.source['columns']) if col['label'] == col_key][0]
-        except:
-            #logger.warning('could not find column named %s in datasoure:\n%s', col_key, source)
-            return
-        metric = copy.deepcopy(self.default_metric)
-        metric['index'] = self.__index__
-        if label is not None:
-            metric['options']['label'] = label
-        metric['metric']['source_id'] = source.source['id']
-        metric['metric']['source_col'] = col_idx
-        self.__index__ += 1
-        self.graph['root']['children'][Graph.METRIC_CHILD_ID]['children'].append(metric)
+        self.add_metrics(source, [col_key], None if label is None else [label])
+
+
+    def add_metrics(self, source, col_keys, labels=None):
+        """
+        Adds a line, or metric, for each column in `col_keys` of the datasource `source`, optionally
+        with the corresponding display labels in `labels`.  Columns are looked up in the datasource's
+        cached label index and the metric nodes are built from `default_metric` without a deepcopy
+        per metric, so adding hundreds of metrics at once is cheap.  Columns which can't be found
+        in the datasource are skipped
+        """
+        col_index = source.column_index()
+        labels = labels if labels is not None else itertools.repeat(None)
+        metrics = []
+        for col_key, label in zip(col_keys, labels):
+            col_idx = col_index.get(col_key)
+            if col_idx is None:
+                #logger.warning('could not find column named %s in datasoure:\n%s', col_key, source)
+                continue
+            metric = _copy_template(Graph.default_metric)
+            metric['index'] = self.__index__
+            if label is not None:
+                metric['options']['label'] = label
+            metric['metric']['source_id'] = source.source['id']
+            metric['metric']['source_col'] = col_idx
+            metric['metric']['type'] = source.source['columns'][col_idx]['type']
+            self.__index__ += 1
+            metrics.append(metric)
+        self.graph['root']['children'][Graph.METRIC_CHILD_ID]['children'].extend(metrics)
 
-    def write(self, basedir='.', set_colors=True):
+    def write(self, basedir='.', set_colors=True, output=None):
         """
         writes graph JSON file to {basedir}/graphs.
         Args:
             basedir (str) : specifies the directory in which to place the graphs
                             will create the graphs directory if it doesn not already
                             exist
+            output  (limnpy.output.Output) : used to write the file, skipping it if its contents
+                            haven't changed.  Defaults to limnpy.output.default_output
         """
+        output = output if output is not None else default_output
         graphdir = os.path.join(basedir, 'graphs')
-        if not os.path.isdir(graphdir):
-            os.mkdir(graphdir)
+        output.makedirs(graphdir)
         graph_fn = os.path.join(graphdir, self.graph['id'] + '.json')
-
-        graph_f = codecs.open(graph_fn, encoding='utf-8', mode='w')
-        json.dump(self.graph, graph_f, indent=2)
-        graph_f.close()
+        with instrument.stage('graph.write'):
+            output.write(graph_fn, json.dumps(self.graph, indent=2))
     
 
+    def write_async(self, basedir='.', executor=None, **kwargs):
+        """ writes the graph on `executor` and returns a concurrent.futures.Future, see limnpy.aio.write_async """
+        import aio
+        return aio.write_async(self, basedir, executor=executor, **kwargs)
+
+
     @classmethod
     def get_color_map(cls, n):
         """ get colorspace based on number of metrics using colorbrewer """
@@ -277,3 +300,8 @@ class Graph(object):
             "dateFormat": "MMM YYYY",
         }
     }
+
+
+def _copy_template(template):
+    """ copies the nested dicts of a default_* template, much cheaper than copy.deepcopy for these plain structures """
+    return dict((k, _copy_template(v) if isinstance(v, dict) else v) for k, v in template.items())
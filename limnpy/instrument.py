@@ -0,0 +1,164 @@
+import sys
+import json
+import time
+import logging
+import threading
+
+try:
+    import resource
+except ImportError:
+    # e.g. windows, where peak RSS is not reported
+    resource = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def peak_rss():
+    """ returns the peak resident set size of this process so far in bytes, or None where it isn't available """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, OS X bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Stats(object):
+    """
+    Collects the wall time, rows processed and peak RSS of each instrumented stage.  Stages
+    are recorded in the order they finish as dicts with `name`, `start` (a unix timestamp),
+    `seconds`, `rows`, `peak_rss` and `depth` (how deeply nested the stage was) keys, and are
+    passed to `callback` if given.
+
+        >>> stats = Stats()
+        >>> with stats.stage('parse') as st:
+        ...     st.rows = 10
+        >>> [(s['name'], s['rows']) for s in stats.stages]
+        [('parse', 10)]
+    """
+
+    def __init__(self, callback=None):
+        self.stages = []
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def stage(self, name, rows=None):
+        """ returns a context manager which times the enclosed block as stage `name` """
+        return _Stage(self, name, rows)
+
+    def add(self, record):
+        with self._lock:
+            self.stages.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def totals(self):
+        """
+        returns a list of per stage name dicts with the number of `calls`, the summed `seconds` and
+        `rows` and the highest `peak_rss`, in the order each stage name first started, which is how
+        stages run once per chunk or per file are reported
+        """
+        totals = {}
+        order = []
+        for record in sorted(self.stages, key=lambda record: record['start']):
+            name = record['name']
+            if name not in totals:
+                order.append(name)
+                totals[name] = {'name' : name, 'calls' : 0, 'seconds' : 0.0, 'rows' : None,
+                                'peak_rss' : None, 'depth' : record['depth']}
+            total = totals[name]
+            total['calls'] += 1
+            total['seconds'] += record['seconds']
+            if record['rows'] is not None:
+                total['rows'] = (total['rows'] or 0) + record['rows']
+            if record['peak_rss'] is not None:
+                total['peak_rss'] = max(total['peak_rss'] or 0, record['peak_rss'])
+            total['depth'] = min(total['depth'], record['depth'])
+        return [totals[name] for name in order]
+
+    def summary(self):
+        """ returns the stage totals formatted as a table """
+        lines = ['%-32s %6s %10s %12s %10s' % ('stage', 'calls', 'seconds', 'rows', 'peak MB')]
+        for total in self.totals():
+            name = '  ' * total['depth'] + total['name']
+            rows = '%d' % total['rows'] if total['rows'] is not None else '-'
+            rss = '%.1f' % (total['peak_rss'] / 2.0 ** 20) if total['peak_rss'] is not None else '-'
+            lines.append('%-32s %6d %10.3f %12s %10s' % (name, total['calls'], total['seconds'], rows, rss))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return json.dumps({'stages' : self.stages, 'totals' : self.totals()}, indent=2)
+
+
+class _Stage(object):
+
+    def __init__(self, stats, name, rows=None):
+        self.stats = stats
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        local = self.stats._local
+        self.depth = getattr(local, 'depth', 0)
+        local.depth = self.depth + 1
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        seconds = time.time() - self.start
+        self.stats._local.depth = self.depth
+        self.stats.add({'name' : self.name, 'start' : self.start, 'seconds' : seconds, 'rows' : self.rows,
+                        'peak_rss' : peak_rss(), 'depth' : self.depth})
+        return False
+
+
+class _NullStage(object):
+    """ the stage returned while instrumentation is disabled, does no work so hooks cost nothing """
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_null_stage = _NullStage()
+_active = None
+
+
+def enable(stats=None, callback=None):
+    """
+    starts recording the stages instrumented throughout limnpy into `stats`, or a new Stats
+    object passing each stage to `callback`, and returns it
+    """
+    global _active
+    _active = stats if stats is not None else Stats(callback)
+    return _active
+
+
+def disable():
+    """ stops recording stages and returns the Stats object they were recorded into, if any """
+    global _active
+    stats, _active = _active, None
+    return stats
+
+
+def stage(name, rows=None):
+    """
+    returns a context manager which records the enclosed block as stage `name` while
+    instrumentation is enabled, and a shared no-op one otherwise.  `rows` can be passed
+    or set on the returned object once it's known:
+
+        with instrument.stage('pivot') as st:
+            df = pivot(...)
+            st.rows = len(df)
+    """
+    if _active is None:
+        return _null_stage
+    return _active.stage(name, rows)
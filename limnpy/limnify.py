@@ -6,10 +6,14 @@ import datetime
 import dateutil.parser
 import sys
 import pprint
+import traceback
+import multiprocessing
 
 sys.path.insert(0, os.path.abspath('..'))
 
 import limnpy
+from limnpy import pivot, instrument, columnar
+from limnpy.dates import DateParser
 
 
 def main():
@@ -34,10 +38,39 @@ def main():
     """
 
 
+    args = make_parser().parse_args()
+    # pprint.pprint(vars(args))
+
+    if args.manifest:
+        run = run_manifest
+    elif args.watch:
+        run = run_watch
+    else:
+        run = limnify
+    if args.profile or args.profile_json:
+        stats = instrument.enable()
+        try:
+            status = run(args)
+        finally:
+            instrument.disable()
+            if args.profile:
+                sys.stderr.write('%s\n' % stats.summary())
+            if args.profile_json:
+                with open(args.profile_json, 'w') as f:
+                    f.write(stats.to_json())
+    else:
+        status = run(args)
+    if status:
+        sys.exit(status)
+
+
+def make_parser():
+    """ the limnify command line parser, also used for the defaults of manifest and site build jobs """
     int_or_str = lambda s : int(s) if isinstance(s,str) and s.isdigit() else s
 
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('data', help='name of file to be limnified', default='STDIN', nargs='?')
+    parser.add_argument('data', help='name of file to be limnified, Parquet (.parquet, .pq), Feather (.feather) and '
+                'Arrow (.arrow, .ipc) files are read directly rather than parsed as text', default='STDIN', nargs='?')
     parser.add_argument('--delim', default='\t', help='delim to use for input file')
     parser.add_argument('--header', default=None, nargs='+', help='this is a space separated list of names to use as the header row'
                 'If your data doesn\'t already have a header row you will need to pass in a list of names to use, otherwise it'
@@ -45,9 +78,12 @@ def main():
                 'displayed in the graph editing interface')
     parser.add_argument('--datecol', type=int_or_str, default=0, help='the date column name or index--required if it is different from `date`')
     parser.add_argument('--datefmt', 
-                help='format to use with datetime.strptime, default uses dateutil.parser.parse')
+                help='format to use with datetime.strptime, default infers the format from the first few dates '
+                'and falls back to dateutil.parser.parse')
     parser.add_argument('--pivot', default=False, action='store_true', 
-                help='whether to try and pivot the data (only supports sum aggregation for now)')
+                help='whether to try and pivot the data, aggregating the values for each date and metric with --agg')
+    parser.add_argument('--agg', default='sum', choices=pivot.AGGFUNCS,
+                help='how to aggregate the values which fall into the same date and metric when pivoting')
     parser.add_argument('--metriccol', type=int_or_str, default=1, 
                 help='the column name or index to use for creating the column (metric) names when pivoting')
     parser.add_argument('--valcol', type=int_or_str, default=2, 
@@ -55,44 +91,58 @@ def main():
     parser.add_argument('--basedir', default='.', help='directory in which to place the output datasources, datafiles and graphs directories')
     parser.add_argument('--name', nargs='+', type=' '.join, help='name of datasource which will be displayed in the UI')
     parser.add_argument('--id', help='the slug / id used to uniquely identify the datasource within a limn installation')
+    parser.add_argument('--chunksize', type=int, default=None,
+                help='stream the input in chunks of this many rows.  With --pivot only the running --agg aggregates per '
+                'date and metric are kept in memory instead of the whole input.  Without --pivot every row is kept as '
+                'it is without --chunksize (and --agg doesn\'t apply), so only the text parsing is done in chunks')
+    parser.add_argument('--start', default=None,
+                help='only keep the rows dated on or after this date (e.g. 2013-01-01).  Whole row groups of Parquet '
+                'inputs before it are skipped without being read')
+    parser.add_argument('--end', default=None,
+                help='only keep the rows dated on or before this date, see --start')
     parser.add_argument('--write_graph', default=False, help='whether to write a graph file containing all columns from the datasource')
+    parser.add_argument('--profile', default=False, action='store_true',
+                help='record the wall time, rows processed and peak memory of each stage and print a summary to stderr')
+    parser.add_argument('--profile_json', default=None, metavar='PATH',
+                help='like --profile, but write the per stage measurements to PATH as JSON')
+    parser.add_argument('--manifest', default=None, metavar='PATH',
+                help='YAML file listing many jobs to run in this one process instead of limnifying `data`.  Each job '
+                'is a mapping of the options above without the dashes (plus `input` for the data file), and any options '
+                'passed on the command line are used as defaults for every job')
+    parser.add_argument('--workers', type=int, default=1,
+                help='number of worker processes to spread the jobs in --manifest over')
+    parser.add_argument('--watch', default=None, metavar='DIR',
+                help='keep running, limnifying the files in DIR whenever they appear or change.  Files which are '
+                'appended to are processed incrementally, merging the new rows into the existing datafile')
+    parser.add_argument('--pattern', default='*', help='with --watch, only process files whose names match this pattern')
+    parser.add_argument('--interval', type=float, default=2.0, help='with --watch, seconds between checks for changed files')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                help='with --watch, seconds a changed file has to stay the same before it is processed')
+    return parser
 
-    args = parser.parse_args()
-    # pprint.pprint(vars(args))
-
-    if args.datefmt:
-        date_parser = lambda s : datetime.datetime.strptime(s, args.datefmt)
-    else:
-        date_parser = dateutil.parser.parse
 
-        
-    if args.data == 'STDIN':
-        data = sys.stdin
-    else:
-        data = args.data
-
-    if not args.pivot:
-        if args.header:
-            df = pd.read_table(data, sep=args.delim, parse_dates=[args.datecol], date_parser=date_parser, names=args.header)
-        else:
-            df = pd.read_table(data, sep=args.delim, parse_dates=[args.datecol], date_parser=date_parser)
-        if isinstance(args.datecol, int):
-            args.datecol = df.columns[args.datecol] 
-    else:
-        if args.header:
-            df_long = pd.read_table(data, sep=args.delim, parse_dates=[args.datecol], date_parser=date_parser, names=args.header)
-        else:
-            df_long = pd.read_table(data, sep=args.delim, parse_dates=[args.datecol], date_parser=date_parser)
+def limnify(args, data=None, append=False):
+    """
+    reads, optionally pivots and writes the input described by the parsed command line `args`.
+    `data` overrides the file named by `args.data`, and with `append` the rows are merged
+    into the existing datafile, see DataSource.write
+    """
 
+    date_parser = DateParser(args.datefmt)
 
-        if isinstance(args.datecol, int):
-            args.datecol = df_long.columns[args.datecol]
-        if isinstance(args.metriccol, int):
-            args.metriccol = df_long.columns[args.metriccol]
-        if isinstance(args.valcol, int):
-            args.valcol = df_long.columns[args.valcol]
+        
+    if data is None:
+        data = sys.stdin if args.data == 'STDIN' else args.data
 
-        df = pd.pivot_table(df_long, rows=[args.datecol], cols=[args.metriccol], values=args.valcol, aggfunc=np.sum)
+    if args.chunksize:
+        df = read_chunked(data, args, date_parser)
+    elif not args.pivot:
+        df = read(data, args, date_parser)
+    else:
+        df_long = read(data, args, date_parser)
+        resolve_columns(df_long, args)
+        with instrument.stage('pivot', rows=len(df_long)):
+            df = pivot.pivot(df_long, args.datecol, args.metriccol, args.valcol, aggfunc=args.agg)
 
 
     sys.stderr.write('output data format (formatted by pandas.DataFrame version):\n%s\n' % df)
@@ -101,12 +151,231 @@ def main():
         args.name = os.path.splitext(os.path.split(args.data)[1])[0]
     if args.id is None:
         args.id = os.path.splitext(os.path.split(args.data)[1])[0]
-    ds = limnpy.DataSource(args.id, args.name, df, date_key=args.datecol, date_fmt=args.datefmt)
-    ds.write(args.basedir)
+    # without --datefmt the datafile keeps the format inferred from the input, so hourly or
+    # finer dates aren't collapsed onto day labels, falling back to the default format
+    date_fmt = args.datefmt or date_parser.date_fmt or limnpy.DataSource.default_date_fmt
+    ds = limnpy.DataSource(args.id, args.name, df, date_key=args.datecol, date_fmt=date_fmt)
+    ds.write(args.basedir, append=append)
 
     if args.write_graph:
         graph = ds.get_graph()
         graph.write(args.basedir)
 
+
+# command line options which apply to the whole run rather than to each job of a manifest
+_run_options = ['manifest', 'workers', 'profile', 'profile_json', 'watch', 'pattern', 'interval', 'debounce']
+
+
+def run_watch(args):
+    """ limnifies the files in `args.watch` as they change until interrupted, see limnpy.watch.Watcher """
+    from limnpy.watch import Watcher
+    watcher = Watcher(args, args.watch, pattern=args.pattern, interval=args.interval, debounce=args.debounce)
+    watcher.run()
+
+
+def load_manifest(path, args):
+    """
+    Reads the YAML job list at `path`, either a list of jobs or a mapping with a `jobs` list and
+    optional `defaults`, and returns one argparse.Namespace per job: the command line `args`
+    updated with the `defaults` and then with the job's own options.  For example:
+
+        defaults:
+          basedir: limn-data
+          datefmt: '%Y-%m-%d_%H'
+        jobs:
+          - input: continents.tsv
+            pivot: true
+            name: Pageviews by Continent
+          - input: editors.tsv
+            datecol: month
+
+    Jobs with unknown options are returned as (job, error message) pairs instead, so that
+    they are reported along with the other failures rather than stopping the whole run
+    """
+    import yaml
+    with open(path) as f:
+        manifest = yaml.safe_load(f) or []
+    if isinstance(manifest, dict):
+        defaults, specs = manifest.get('defaults') or {}, manifest.get('jobs') or []
+    else:
+        defaults, specs = {}, manifest
+    jobs = []
+    for i, spec in enumerate(specs):
+        label = '%s (job %d)' % (spec.get('input', defaults.get('input', args.data)), i + 1)
+        try:
+            jobs.append((label, job_args(args, defaults, spec)))
+        except ValueError as e:
+            jobs.append((label, str(e)))
+    return jobs
+
+
+def job_args(args, *options):
+    """
+    returns a copy of the parsed command line `args` updated with each of the `options` dicts in
+    turn, whose keys are limnify options without the dashes, or `input` for the data file.
+    Raises ValueError for unknown options
+    """
+    known = set(vars(args)) - set(_run_options)
+    job = dict(vars(args))
+    for opts in options:
+        unknown = sorted(set(opts) - set(['input']) - known)
+        if unknown:
+            raise ValueError('unknown options: %s' % ', '.join(unknown))
+        for key, value in opts.items():
+            job['data' if key == 'input' else key] = value
+    return argparse.Namespace(**job)
+
+
+def run_manifest(args):
+    """
+    Runs every job in `args.manifest` in this process, or spread over `args.workers` processes,
+    so that the interpreter and pandas start up once rather than once per job.  A failing job is
+    reported on stderr without stopping the others.  Returns 1 if any job failed, otherwise 0
+    """
+    jobs = load_manifest(args.manifest, args)
+    runnable = [(label, job) for label, job in jobs if isinstance(job, argparse.Namespace)]
+    failures = [(label, error) for label, error in jobs if not isinstance(error, argparse.Namespace)]
+    if args.workers > 1 and len(runnable) > 1:
+        pool = multiprocessing.Pool(args.workers)
+        try:
+            results = pool.map(_run_job, runnable, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(_run_job, runnable)
+    failures.extend((label, error) for label, error in results if error is not None)
+
+    for label, error in failures:
+        sys.stderr.write('limnify: %s failed:\n%s\n' % (label, error))
+    sys.stderr.write('limnify: %d of %d jobs succeeded\n' % (len(jobs) - len(failures), len(jobs)))
+    return 1 if failures else 0
+
+
+def _run_job(labeled_job):
+    """ module level so that it can be pickled for use by multiprocessing workers """
+    label, job = labeled_job
+    try:
+        limnify(job)
+        return label, None
+    except Exception:
+        return label, traceback.format_exc()
+
+
+def read(data, args, date_parser, **kwargs):
+    """
+    reads the input table described by `args`, passing any extra kwargs on to pandas.read_table
+    and parsing the date column with `date_parser`.  If `chunksize` is passed, returns an iterator
+    over the parsed chunks.  Parquet, Feather and Arrow files are read with read_columnar instead
+    """
+    if columnar.format_of(data) is not None:
+        return read_columnar(data, args, date_parser, chunksize=kwargs.get('chunksize'))
+    if args.header:
+        kwargs['names'] = args.header
+    if kwargs.get('chunksize'):
+        reader = pd.read_table(data, sep=args.delim, **kwargs)
+        return (select_dates(parse_datecol(chunk, args, date_parser), args) for chunk in _timed_chunks(reader))
+    with instrument.stage('parse') as st:
+        df = pd.read_table(data, sep=args.delim, **kwargs)
+        st.rows = len(df)
+    return select_dates(parse_datecol(df, args, date_parser), args)
+
+
+def read_columnar(path, args, date_parser, chunksize=None):
+    """
+    reads the Parquet, Feather or Arrow file `path` without any text parsing.  When pivoting only
+    the date, metric and value columns are read, and Parquet row groups outside of --start and
+    --end are skipped, see limnpy.columnar
+    """
+    if args.header:
+        raise ValueError('--header can not be used with %s, which names its own columns' % path)
+    names = columnar.column_names(path)
+    resolve_columns(names, args)
+    columns = [args.datecol, args.metriccol, args.valcol] if args.pivot else None
+    start, end = _date_range(args)
+    if chunksize:
+        chunks = columnar.read(path, columns, args.datecol, start, end, args.datefmt, chunksize=chunksize)
+        return (select_dates(parse_datecol(chunk, args, date_parser), args) for chunk in _timed_chunks(chunks))
+    with instrument.stage('parse') as st:
+        df = columnar.read(path, columns, args.datecol, start, end, args.datefmt)
+        st.rows = len(df)
+    return select_dates(parse_datecol(df, args, date_parser), args)
+
+
+def select_dates(df, args):
+    """ drops the rows of `df` (with parsed dates) which are outside of --start and --end """
+    start, end = _date_range(args)
+    if start is None and end is None:
+        return df
+    return columnar.between(df, args.datecol, start, end)
+
+
+def _date_range(args):
+    # manifest and site jobs set these without going through the parser, so they are converted here
+    start = pd.Timestamp(args.start) if args.start is not None else None
+    end = pd.Timestamp(args.end) if args.end is not None else None
+    return start, end
+
+
+def _timed_chunks(reader):
+    """ yields the chunks of the iterator `reader`, recording the parsing of each one as a stage """
+    while True:
+        with instrument.stage('parse') as st:
+            chunk = next(reader, None)
+            if chunk is not None:
+                st.rows = len(chunk)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def parse_datecol(df, args, date_parser):
+    """ resolves `args.datecol` to a column name and replaces that column of `df` with parsed dates """
+    if isinstance(args.datecol, int):
+        args.datecol = df.columns[args.datecol]
+    with instrument.stage('dates', rows=len(df)):
+        df[args.datecol] = date_parser(df[args.datecol].values)
+    return df
+
+
+def resolve_columns(df, args):
+    """ replaces integer datecol, metriccol and valcol args with the corresponding column names of `df` (or list of names) """
+    columns = df.columns if isinstance(df, pd.DataFrame) else df
+    if isinstance(args.datecol, int):
+        args.datecol = columns[args.datecol]
+    if isinstance(args.metriccol, int):
+        args.metriccol = columns[args.metriccol]
+    if isinstance(args.valcol, int):
+        args.valcol = columns[args.valcol]
+
+
+def read_chunked(data, args, date_parser):
+    """
+    Streams the input in chunks of `args.chunksize` rows.  When pivoting, each chunk is reduced
+    to partial aggregates per (date, metric) which are merged into the running partials, so memory
+    is bounded by the number of distinct (date, metric) cells rather than the number of input rows.
+    Without --pivot every input row is kept, as it is without --chunksize, so the parsed chunks are
+    just concatenated and only the text parsing is bounded by the chunk size.
+    Returns the same DataFrame as the unchunked path
+    """
+    chunks = read(data, args, date_parser, chunksize=args.chunksize)
+    if args.pivot:
+        aggregator = pivot.PivotAggregator(args.agg)
+        for chunk in chunks:
+            resolve_columns(chunk, args)
+            with instrument.stage('pivot', rows=len(chunk)):
+                aggregator.update(chunk[args.datecol].values, chunk[args.metriccol].values, chunk[args.valcol].values)
+        with instrument.stage('pivot.result'):
+            df = aggregator.result(args.datecol, args.metriccol)
+        if len(df) == 0:
+            raise ValueError('no rows found in input: %s' % args.data)
+        return df.sort_index()
+    chunks = list(chunks)
+    if not chunks:
+        raise ValueError('no rows found in input: %s' % args.data)
+    with instrument.stage('concat'):
+        return pd.concat(chunks, ignore_index=True)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,162 @@
+import os, logging
+import errno
+import json
+import hashlib
+import tempfile
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# files created with tempfile are only readable by their owner, so new files are
+# chmod'ed to what open() would have given them
+_umask = os.umask(0o022)
+os.umask(_umask)
+
+
+class Output(object):
+    """
+    Writes serialized datafiles, datasources, graphs and dashboards to disk.  The new content
+    is compared with what is already there (first by size, then by a sha1 of the contents, or
+    with the digests recorded in an optional sidecar manifest which saves reading the old file)
+    and unchanged files are left alone, so their mtimes and any HTTP caches in front of limn stay
+    valid.  Changed files are written to a temporary file in the same directory and then renamed
+    over the target, so readers never see a partially written file.  The `written` and `skipped`
+    attributes count the files in each category.
+
+        >>> out = Output()
+        >>> out.write('doctest_tmp_output.json', '{}')
+        True
+        >>> out.write('doctest_tmp_output.json', '{}')
+        False
+        >>> (out.written, out.skipped)
+        (1, 1)
+        >>> os.remove('doctest_tmp_output.json')
+    """
+
+    def __init__(self, manifest_path=None, dirs=None):
+        """
+        Args:
+            manifest_path (str) : optional path to a JSON file recording the digest, size and mtime
+                                  of every file written.  When a file's size and mtime still match
+                                  the manifest its contents don't need to be read to be compared
+            dirs          (list): directories which the caller has already created, so makedirs()
+                                  doesn't check them again for each file (see limnpy.Batch)
+        """
+        self.written = 0
+        self.skipped = 0
+        self.dirs = frozenset(dirs) if dirs is not None else frozenset()
+        self.manifest_path = manifest_path
+        self.manifest = {}
+        if manifest_path is not None and os.path.exists(manifest_path):
+            self.manifest = json.load(open(manifest_path))
+        self._lock = threading.Lock()
+
+
+    def write(self, path, content):
+        """
+        Writes the str `content` to `path` unless the file already has exactly that content.
+        Returns True if the file was written and False if it was skipped
+        """
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        digest = hashlib.sha1(content).hexdigest()
+        written = not self._unchanged(path, content, digest)
+        if written:
+            _atomic_write(path, content)
+            logger.debug('wrote file: %s', path)
+        else:
+            logger.debug('skipping unchanged file: %s', path)
+        with self._lock:
+            if written:
+                self.written += 1
+            else:
+                self.skipped += 1
+            if self.manifest_path is not None:
+                stat = os.stat(path)
+                self.manifest[os.path.abspath(path)] = [digest, stat.st_size, stat.st_mtime]
+        return written
+
+
+    def makedirs(self, path):
+        """ creates the directory `path` like the module level makedirs, unless it is one of `self.dirs` """
+        if path not in self.dirs:
+            makedirs(path)
+
+
+    def _unchanged(self, path, content, digest):
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != len(content):
+            return False
+        entry = self.manifest.get(os.path.abspath(path))
+        if entry is not None and entry[1:] == [stat.st_size, stat.st_mtime]:
+            return entry[0] == digest
+        old = hashlib.sha1()
+        f = open(path, 'rb')
+        for block in iter(lambda : f.read(1 << 20), b''):
+            old.update(block)
+        f.close()
+        return old.hexdigest() == digest
+
+
+    def save_manifest(self):
+        """ writes the manifest back to `manifest_path` (itself atomically) """
+        if self.manifest_path is None:
+            return
+        with self._lock:
+            content = json.dumps(self.manifest, indent=2, sort_keys=True)
+        _atomic_write(self.manifest_path, content.encode('utf-8'))
+
+
+    def __repr__(self):
+        return '<Output written=%d skipped=%d>' % (self.written, self.skipped)
+
+
+def makedirs(path):
+    """ creates the directory `path` and its parents if they don't exist, safe to call from concurrent writers """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def _atomic_write(path, content):
+    """ writes `content` to a temporary file next to `path` and renames it over `path` """
+    tmp_f = _temp_file(path)
+    try:
+        tmp_f.write(content)
+        tmp_f.close()
+        _replace(tmp_f.name, path)
+    except:
+        _discard(tmp_f)
+        raise
+
+
+def _temp_file(path):
+    """ opens a temporary file in the directory of `path` for writing, to be renamed over `path` by _replace """
+    dirname, basename = os.path.split(path)
+    return tempfile.NamedTemporaryFile(dir=dirname or '.', prefix='.' + basename + '.', delete=False)
+
+
+def _replace(tmp_path, path):
+    """ gives the temporary file `tmp_path` the mode `path` has (or would get from open()) and renames it over `path` """
+    if os.path.exists(path):
+        shutil.copymode(path, tmp_path)
+    else:
+        os.chmod(tmp_path, 0o666 & ~_umask)
+    os.rename(tmp_path, path)
+
+
+def _discard(tmp_f):
+    """ closes and removes the temporary file `tmp_f` """
+    tmp_f.close()
+    if os.path.exists(tmp_f.name):
+        os.remove(tmp_f.name)
+
+
+# used by the write() methods of DataSource, Graph and Dashboard when they aren't given an Output
+default_output = Output()
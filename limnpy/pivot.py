@@ -0,0 +1,157 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+AGGFUNCS = ['sum', 'count', 'mean', 'min', 'max', 'last']
+
+# the partial statistics kept per (date, metric) cell for each aggregation, and the
+# operation used to combine two sets of partials for the same cell
+_partials = {
+    'sum'   : [('sum', 'sum')],
+    'count' : [('count', 'sum')],
+    'mean'  : [('sum', 'sum'), ('count', 'sum')],
+    'min'   : [('min', 'min')],
+    'max'   : [('max', 'max')],
+    'last'  : [('last', 'last')],
+}
+
+
+def _group_ends(starts, n):
+    return np.concatenate([starts[1:], [n]])
+
+
+_reducers = {
+    'sum'   : lambda values, starts : np.add.reduceat(values, starts),
+    'count' : lambda values, starts : _group_ends(starts, len(values)) - starts,
+    'min'   : lambda values, starts : np.minimum.reduceat(values, starts),
+    'max'   : lambda values, starts : np.maximum.reduceat(values, starts),
+    'last'  : lambda values, starts : values[_group_ends(starts, len(values)) - 1],
+}
+
+
+def _reduce(dates, metrics, columns):
+    """
+    Groups rows by (date, metric) and reduces each of the `columns`, a list of (values, op)
+    pairs where op is a key of `_reducers`.  Dates and metrics are factorized into integer codes
+    which are combined into a single cell code per row, so the grouping is one stable sort of
+    an int64 array (or a bincount when only sums and counts are needed) followed by ufunc.reduceat.
+    Returns (dates, metrics, reduced) for the occupied cells, ordered by date then metric
+    """
+    date_codes, date_index = pd.factorize(np.asarray(dates), sort=True)
+    metric_codes, metric_index = pd.factorize(np.asarray(metrics), sort=True)
+    keep = (date_codes >= 0) & (metric_codes >= 0)
+    n_metrics = max(len(metric_index), 1)
+    cells = date_codes[keep].astype(np.int64) * n_metrics + metric_codes[keep]
+    ncells = len(date_index) * n_metrics
+    ops = [op for values, op in columns]
+
+    if set(ops) <= set(['sum', 'count']) and ncells <= max(4 * len(cells), 1 << 20):
+        # dense fast path: np.bincount is O(rows) and needs no sort
+        counts = np.bincount(cells, minlength=ncells)
+        occupied = np.flatnonzero(counts)
+        reduced = []
+        for values, op in columns:
+            if op == 'count':
+                reduced.append(counts[occupied])
+            else:
+                values = np.asarray(values)[keep]
+                sums = np.bincount(cells, weights=values, minlength=ncells)[occupied]
+                if values.dtype.kind in 'iub':
+                    sums = sums.astype(np.int64)
+                reduced.append(sums)
+    else:
+        order = np.argsort(cells, kind='mergesort') # stable, so `last` respects the input order
+        cells = cells[order]
+        if len(cells):
+            starts = np.flatnonzero(np.concatenate([[True], cells[1:] != cells[:-1]]))
+        else:
+            starts = np.zeros(0, dtype=np.int64)
+        occupied = cells[starts]
+        reduced = []
+        for values, op in columns:
+            values = np.asarray(values)[keep][order]
+            if len(starts):
+                reduced.append(_reducers[op](values, starts))
+            else:
+                reduced.append(values[:0])
+    return date_index[occupied // n_metrics], metric_index[occupied % n_metrics], reduced
+
+
+class PivotAggregator(object):
+    """
+    Pivots "long" format (date, metric, value) rows into a date indexed DataFrame with one
+    column per metric, aggregating the values which fall into the same (date, metric) cell
+    with one of `AGGFUNCS`.  Rows can be fed in with any number of update() calls, and only
+    the partial aggregates for each occupied cell are kept between calls, so memory is bounded
+    by the number of distinct cells rather than the number of rows.
+
+        >>> import pandas as pd
+        >>> p = PivotAggregator('mean')
+        >>> p.update(pd.to_datetime(['2013-01-01', '2013-01-01', '2013-01-02']), ['Asia', 'Asia', 'Africa'], [1, 2, 5])
+        >>> p.update(pd.to_datetime(['2013-01-02']), ['Africa'], [7])
+        >>> p.result()
+                    Africa  Asia
+        2013-01-01     NaN   1.5
+        2013-01-02     6.0   NaN
+    """
+
+    def __init__(self, aggfunc='sum'):
+        if aggfunc not in AGGFUNCS:
+            raise ValueError('aggfunc must be one of %s, not: %s' % (AGGFUNCS, aggfunc))
+        self.aggfunc = aggfunc
+        self.dates = None
+        self.metrics = None
+        self.stats = None
+
+
+    def update(self, dates, metrics, values):
+        """ aggregates another batch of rows into the running partials """
+        values = np.asarray(values)
+        notnull = np.asarray(pd.notnull(values))
+        if not notnull.all():
+            dates, metrics, values = np.asarray(dates)[notnull], np.asarray(metrics)[notnull], values[notnull]
+        partials = _partials[self.aggfunc]
+        dates, metrics, stats = _reduce(dates, metrics, [(values, stat) for stat, combine in partials])
+        if self.stats is not None:
+            columns = [(np.concatenate([old, new]), combine)
+                    for old, new, (stat, combine) in zip(self.stats, stats, partials)]
+            dates, metrics, stats = _reduce(np.concatenate([np.asarray(self.dates), np.asarray(dates)]),
+                                            np.concatenate([np.asarray(self.metrics), np.asarray(metrics)]),
+                                            columns)
+        self.dates, self.metrics, self.stats = dates, metrics, stats
+
+
+    def result(self, datecol=None, metriccol=None):
+        """ returns the pivoted DataFrame, with NaN in the cells which received no non-null values """
+        if self.stats is None:
+            return pd.DataFrame()
+        if self.aggfunc == 'mean':
+            values = self.stats[0] / self.stats[1].astype(float)
+        else:
+            values = self.stats[0]
+        date_codes, date_index = pd.factorize(np.asarray(self.dates), sort=True)
+        metric_codes, metric_index = pd.factorize(np.asarray(self.metrics), sort=True)
+        shape = (len(date_index), len(metric_index))
+        if len(values) < shape[0] * shape[1]:
+            dense = np.empty(shape, dtype=float)
+            dense.fill(np.nan)
+        else:
+            dense = np.empty(shape, dtype=values.dtype)
+        dense[date_codes, metric_codes] = values
+        return pd.DataFrame(dense,
+                index=pd.DatetimeIndex(date_index, name=datecol),
+                columns=pd.Index(metric_index, name=metriccol))
+
+
+def pivot(df, datecol, metriccol, valcol, aggfunc='sum'):
+    """
+    Faster replacement for pandas.pivot_table(df, rows=[datecol], cols=[metriccol], values=valcol, aggfunc=...)
+    which supports the aggregations in `AGGFUNCS`
+    """
+    p = PivotAggregator(aggfunc)
+    p.update(df[datecol].values, df[metriccol].values, df[valcol].values)
+    return p.result(datecol, metriccol)
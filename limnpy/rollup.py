@@ -0,0 +1,95 @@
+import os, logging
+import datetime
+import pandas as pd
+
+from datasource import DataSource
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+# (name, pandas resample rule, limn timespan step, approximate length of one step)
+# ordered from finest to coarsest.  weeks start on monday and are labeled by that monday
+RESOLUTIONS = [
+    ('hourly',  'H',     '1h',  datetime.timedelta(hours=1)),
+    ('daily',   'D',     '1d',  datetime.timedelta(days=1)),
+    ('weekly',  'W-MON', '1w',  datetime.timedelta(days=7)),
+    ('monthly', 'MS',    '1mo', datetime.timedelta(days=30.44)),
+]
+_resolutions = dict((r[0], r) for r in RESOLUTIONS)
+
+# aggregations which give the same answer when applied to already aggregated values,
+# so coarser rollups can be computed from the (much smaller) daily rollup
+_decomposable = set(['sum', 'min', 'max', 'first', 'last'])
+
+
+def rollups(source, resolutions=('daily', 'weekly', 'monthly'), how='sum'):
+    """
+    Downsamples the limnpy.DataSource `source` into one sibling DataSource per resolution in
+    `resolutions` (names from RESOLUTIONS).  Each sibling has the id `{id}_{resolution}`, a datafile
+    url next to the original and the matching `timespan.step`.  When every aggregation can be
+    recomposed, the weekly and monthly rollups are computed from the daily one, so the full
+    resolution data is only resampled once.
+    Args:
+        source      (DataSource) : the datasource to roll up
+        resolutions (list)       : names of the resolutions to produce
+        how         (str|dict)   : the aggregation (`sum`, `mean`, `min`, `max`, `first`, `last`...)
+                                   to use for every column, or a dict mapping column labels to
+                                   aggregations, with unlisted columns summed
+    Returns:
+        a dict mapping resolution name to DataSource
+    """
+    source.infer()
+    data = source.data
+    if isinstance(how, dict):
+        how = dict((col, how.get(col, 'sum')) for col in data.columns)
+        aggs = set(how.values())
+    else:
+        aggs = set([how])
+    for resolution in resolutions:
+        if resolution not in _resolutions:
+            raise ValueError('unknown resolution: %s, must be one of %s' % (resolution, [r[0] for r in RESOLUTIONS]))
+
+    frames = {}
+    daily = None
+    for name, rule, step, length in RESOLUTIONS:
+        if name not in resolutions and not (name == 'daily' and aggs <= _decomposable):
+            continue
+        base = data
+        if daily is not None and aggs <= _decomposable and name in ('weekly', 'monthly'):
+            base = daily
+        frame = base.resample(rule, closed='left', label='left').agg(how)[list(data.columns)]
+        if name == 'daily':
+            daily = frame
+        if name in resolutions:
+            frames[name] = frame
+
+    siblings = {}
+    for name, frame in frames.items():
+        limn_id = '%s_%s' % (source.source['id'], name)
+        url = source.source['url']
+        url = os.path.join(os.path.dirname(url), limn_id + os.path.splitext(url)[1]) if url else None
+        date_fmt = source.date_fmt if name == 'hourly' else DataSource.default_date_fmt
+        sibling = DataSource(limn_id, '%s (%s)' % (source.source['name'], name), frame,
+                url=url, types=source.types, date_fmt=date_fmt, copy=False)
+        sibling.source['timespan']['step'] = _resolutions[name][2]
+        siblings[name] = sibling
+    return siblings
+
+
+def rollup_graph(siblings, start, end, min_points=100, metric_ids=None, title=None, graph_id=None):
+    """
+    Returns a limnpy.Graph for the date range [start, end] built against the coarsest of the
+    rollup `siblings` (as returned by rollups()) which still has at least `min_points` steps
+    in that range, falling back to the finest one available.
+    """
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    available = [r for r in RESOLUTIONS if r[0] in siblings]
+    if not available:
+        raise ValueError('no rollups to choose from')
+    chosen = available[0]
+    for resolution in available:
+        if span.total_seconds() / resolution[3].total_seconds() >= min_points:
+            chosen = resolution
+    logger.debug('using %s rollup for a graph spanning %s', chosen[0], span)
+    return siblings[chosen[0]].get_graph(metric_ids, title=title, graph_id=graph_id)
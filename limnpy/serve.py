@@ -0,0 +1,347 @@
+"""
+A static file server for previewing (and load testing) a limn data directory before deploying it,
+behaving like the CDN in front of production:
+
+    $ limnpy serve limn-data --port 8000
+
+Responses carry strong ETags computed from the file contents, so revalidating clients get a
+304 Not Modified.  Text files (csv, json, yaml...) are sent gzipped to clients which accept it,
+using the precompressed `{file}.gz` written by DataSource.write(gzip=True) when it is up to date
+and compressing on the fly otherwise.  Single byte ranges are supported (a range request gets
+the uncompressed file, so offsets refer to the file on disk).  Recently served files, their
+compressed copies and their ETags are kept in an in-memory LRU cache, which is checked against
+each file's size and mtime so changes on disk show up straight away.
+"""
+import os, sys, logging
+import gzip
+import hashlib
+import mimetypes
+import threading
+import posixpath
+import urllib
+import urlparse
+import collections
+from StringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# extensions worth compressing, datafiles and metadata are text
+COMPRESSIBLE = set(['.csv', '.tsv', '.json', '.yaml', '.yml', '.txt', '.html', '.js', '.css', '.svg'])
+
+CONTENT_TYPES = {
+    '.csv' : 'text/csv',
+    '.tsv' : 'text/tab-separated-values',
+    '.json' : 'application/json',
+    '.yaml' : 'text/yaml',
+    '.yml' : 'text/yaml',
+    '.gz' : 'application/gzip',
+}
+
+# a response body, either in memory (`body`) or streamed from the file `path`
+_Entity = collections.namedtuple('_Entity', 'body path size etag encoding')
+
+
+class LRUCache(object):
+    """
+    A thread safe least recently used cache holding at most `max_bytes` of values.  Each value is
+    stored with the signature (size, mtime...) of the file it came from and is only returned while
+    the file still has that signature
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key, sig):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] != sig:
+                if entry is not None:
+                    self.bytes -= entry[2]
+                self.misses += 1
+                return None
+            # reinserting moves the entry to the most recently used end
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+
+    def put(self, key, sig, value, cost):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            if cost > self.max_bytes:
+                return
+            self._entries[key] = (sig, value, cost)
+            self.bytes += cost
+            while self.bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted[2]
+
+
+    def __repr__(self):
+        return '<LRUCache entries=%d bytes=%d hits=%d misses=%d>' % (len(self._entries), self.bytes, self.hits, self.misses)
+
+
+class PreviewServer(ThreadingMixIn, HTTPServer):
+    """ serves the files in `basedir`, see the module docstring """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, basedir, address=('127.0.0.1', 8000), cache_bytes=64 << 20):
+        """
+        Args:
+            basedir     (str)   : directory to serve, usually the basedir passed to the write() methods
+            address     (tuple) : (host, port) to listen on
+            cache_bytes (int)   : size of the in-memory cache.  Files larger than an eighth of it are
+                                  streamed from disk rather than cached, and only compressed on the
+                                  fly if they are small enough to be cached
+        """
+        HTTPServer.__init__(self, address, PreviewHandler)
+        self.basedir = os.path.realpath(basedir)
+        self.cache = LRUCache(cache_bytes)
+        self.max_item = cache_bytes // 8
+
+
+    def entity(self, path, sig, compress):
+        """ the (possibly cached) body, gzipped if `compress`, and ETag of the file `path` which has the signature `sig` """
+        if not compress:
+            return self._entity(path, sig, path, sig, None)
+        gz_path = path + '.gz'
+        gz_sig = _signature(gz_path)
+        if gz_sig is not None and gz_sig[1] >= sig[1]:
+            # a precompressed copy written at the same time or after the file
+            return self._entity(path, sig, gz_path, gz_sig, 'gzip')
+        if sig[0] > self.max_item:
+            return self._entity(path, sig, path, sig, None)
+        key, cache_sig = (path, 'gzip'), (sig, None)
+        entity = self.cache.get(key, cache_sig)
+        if entity is None:
+            with open(path, 'rb') as f:
+                body = _gzip(f.read())
+            entity = _Entity(body, None, len(body), _etag(body), 'gzip')
+            self.cache.put(key, cache_sig, entity, len(body))
+        return entity
+
+
+    def _entity(self, path, sig, source, source_sig, encoding):
+        key = (path, encoding)
+        cache_sig = (sig, source_sig)
+        entity = self.cache.get(key, cache_sig)
+        if entity is not None:
+            return entity
+        if source_sig[0] <= self.max_item:
+            with open(source, 'rb') as f:
+                body = f.read()
+            entity = _Entity(body, None, len(body), _etag(body), encoding)
+            self.cache.put(key, cache_sig, entity, len(body))
+        else:
+            # too big to keep in memory, only the ETag is cached
+            with open(source, 'rb') as f:
+                digest = hashlib.sha1()
+                for block in iter(lambda : f.read(1 << 20), b''):
+                    digest.update(block)
+            entity = _Entity(None, source, source_sig[0], '"%s"' % digest.hexdigest(), encoding)
+            self.cache.put(key, cache_sig, entity, 0)
+        return entity
+
+
+class PreviewHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._serve(True)
+
+
+    def do_HEAD(self):
+        self._serve(False)
+
+
+    def log_message(self, fmt, *args):
+        logger.debug('%s %s', self.address_string(), fmt % args)
+
+
+    def _serve(self, send_body):
+        path = self._translate(self.path)
+        sig = _signature(path) if path is not None and os.path.isfile(path) else None
+        if sig is None:
+            self.send_error(404, 'File not found')
+            return
+        range_header = self.headers.get('Range')
+        compressible = os.path.splitext(path)[1].lower() in COMPRESSIBLE
+        compress = compressible and range_header is None and _accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        entity = self.server.entity(path, sig, compress)
+
+        if _etag_matches(self.headers.get('If-None-Match'), entity.etag):
+            self.send_response(304)
+            self._send_common_headers(entity, compressible)
+            self.end_headers()
+            return
+
+        start, end, status = 0, entity.size - 1, 200
+        if range_header is not None and self.headers.get('If-Range', entity.etag) == entity.etag:
+            byte_range = _parse_range(range_header, entity.size)
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % entity.size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+
+        self.send_response(status)
+        self._send_common_headers(entity, compressible)
+        self.send_header('Content-Type', _content_type(path))
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, entity.size))
+        if entity.encoding is not None:
+            self.send_header('Content-Encoding', entity.encoding)
+        self.end_headers()
+        if send_body:
+            self._send_body(entity, start, end)
+
+
+    def _send_common_headers(self, entity, compressible):
+        self.send_header('ETag', entity.etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        # revalidate on every use, which the ETags make cheap, so a preview never shows stale files
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+
+
+    def _send_body(self, entity, start, end):
+        if entity.body is not None:
+            self.wfile.write(entity.body[start:end + 1])
+            return
+        with open(entity.path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = f.read(min(1 << 16, remaining))
+                if not block:
+                    break
+                self.wfile.write(block)
+                remaining -= len(block)
+
+
+    def _translate(self, url):
+        """ the file under the served basedir which `url` refers to, or None if it points outside of it """
+        path = posixpath.normpath(urllib.unquote(urlparse.urlparse(url).path))
+        parts = [part for part in path.split('/') if part and part not in (os.curdir, os.pardir)]
+        path = os.path.realpath(os.path.join(self.server.basedir, *parts))
+        if path != self.server.basedir and not path.startswith(self.server.basedir + os.sep):
+            return None
+        return path
+
+
+def _signature(path):
+    """ (size, mtime, inode) of `path`, or None if it doesn't exist """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime, stat.st_ino)
+
+
+def _etag(body):
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def _gzip(content):
+    """ gzips `content` with a zero timestamp, so the same content always compresses to the same bytes (and ETag) """
+    buf = StringIO()
+    f = gzip.GzipFile(filename='', mode='wb', fileobj=buf, mtime=0)
+    f.write(content)
+    f.close()
+    return buf.getvalue()
+
+
+def _accepts_gzip(accept_encoding):
+    """
+    whether the Accept-Encoding header allows gzip
+
+        >>> _accepts_gzip('gzip, deflate'), _accepts_gzip('gzip;q=0'), _accepts_gzip('identity')
+        (True, False, False)
+    """
+    for coding in accept_encoding.split(','):
+        params = [param.strip() for param in coding.split(';')]
+        if params[0].lower() in ('gzip', 'x-gzip'):
+            return not any(param.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000') for param in params[1:])
+    return False
+
+
+def _etag_matches(if_none_match, etag):
+    """ weak comparison of `etag` with the If-None-Match header, as RFC 7232 asks for """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    strip_weak = lambda tag : tag[2:] if tag.startswith('W/') else tag
+    return strip_weak(etag) in [strip_weak(tag.strip()) for tag in if_none_match.split(',')]
+
+
+def _parse_range(header, size):
+    """
+    parses a single `bytes=` range of a `size` byte body into inclusive (start, end) offsets.
+    Returns None for ranges which aren't understood (including multiple ranges), so the whole body
+    is sent, and False for ranges which can't be satisfied
+
+        >>> _parse_range('bytes=0-99', 1000), _parse_range('bytes=900-', 1000), _parse_range('bytes=-100', 1000)
+        ((0, 99), (900, 999), (900, 999))
+        >>> _parse_range('bytes=0-1,5-6', 1000), _parse_range('bytes=1000-', 1000)
+        (None, False)
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if first == '':
+            length = int(last)
+            if length == 0:
+                return False
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last != '' else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def run(args):
+    """ `limnpy serve` """
+    server = PreviewServer(args.basedir, (args.host, args.port), cache_bytes=args.cache_mb << 20)
+    sys.stderr.write('limnpy serve: serving %s on http://%s:%d/\n' % (server.basedir, args.host, server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.stderr.write('limnpy serve: stopped, %r\n' % server.cache)
+    finally:
+        server.server_close()
@@ -0,0 +1,213 @@
+import os, sys, logging
+import copy
+import json
+import time
+import fnmatch
+import traceback
+from StringIO import StringIO
+
+from limnpy import limnify, columnar
+from limnpy.output import _atomic_write
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Watcher(object):
+    """
+    Keeps limnifying the files in a directory as they appear or change, in one long lived process.
+    The directory is polled every `interval` seconds and a new or modified file is processed once
+    its size and mtime have stayed the same for `debounce` seconds, so files which are still being
+    written aren't read half way.  Only the datasource (and graph) of the changed file is rebuilt.
+
+    The input files are assumed to be logs which are appended to in date order.  For each file the
+    watcher remembers how far it has read, and where the rows of the last date it read begin.  When
+    the file grows, only the lines from that point on are read and merged into the existing datafile
+    with DataSource.write(append=True), so the last date is re-aggregated with any of its rows that
+    were appended since.  A file which shrinks or is replaced (a new inode, e.g. after log rotation)
+    is processed from the start again, as are Parquet, Feather and Arrow files, which can't be
+    appended to.  The offsets are kept in a JSON state file so that a restarted
+    watcher carries on where it stopped.
+
+    Example:
+
+        >>> import os
+        >>> os.makedirs('doctest_tmp/logs')
+        >>> open('doctest_tmp/logs/hits.tsv', 'w').write('date\\tpage\\tcount\\n2013-01-01\\ta\\t1\\n2013-01-02\\ta\\t2\\n')
+        >>> args = limnify.make_parser().parse_args(['--pivot', '--basedir', 'doctest_tmp'])
+        >>> watcher = Watcher(args, 'doctest_tmp/logs', debounce=0)
+        >>> watcher.poll(), watcher.poll() # the first poll only sees the new file, the second processes it
+        ([], ['doctest_tmp/logs/hits.tsv'])
+        >>> print open('doctest_tmp/datafiles/hits.csv').read().rstrip()
+        date,a
+        2013-01-01,1
+        2013-01-02,2
+        >>> entry = watcher.state['doctest_tmp/logs/hits.tsv']
+        >>> entry['offset'], entry['end'] # the 2013-01-02 line starts at byte 31
+        (31, 46)
+
+        lines appended to the file are read from the start of the last date on and merged into the datafile
+
+        >>> open('doctest_tmp/logs/hits.tsv', 'a').write('2013-01-02\\ta\\t5\\n2013-01-03\\ta\\t3\\n')
+        >>> watcher.poll(), watcher.poll()
+        ([], ['doctest_tmp/logs/hits.tsv'])
+        >>> print open('doctest_tmp/datafiles/hits.csv').read().rstrip()
+        date,a
+        2013-01-01,1
+        2013-01-02,7
+        2013-01-03,3
+        >>> entry = watcher.state['doctest_tmp/logs/hits.tsv']
+        >>> entry['offset'], entry['end']
+        (61, 76)
+    """
+
+    def __init__(self, args, dirname, pattern='*', interval=2.0, debounce=1.0, state_path=None):
+        """
+        Args:
+            args     (argparse.Namespace) : the limnify options to process each file with.  The id
+                                            and name of each datasource default to the file's name
+            dirname  (str)   : directory to watch
+            pattern  (str)   : shell style pattern of the file names to process
+            interval (float) : seconds between polls of `dirname`
+            debounce (float) : seconds a file has to stay unchanged before it is processed
+            state_path (str) : JSON file to keep the per file offsets in, defaults to
+                               {args.basedir}/.limnify_watch.json
+        """
+        self.args = args
+        self.dirname = dirname
+        self.pattern = pattern
+        self.interval = interval
+        self.debounce = debounce
+        self.state_path = state_path or os.path.join(args.basedir, '.limnify_watch.json')
+        self.state = {}
+        if os.path.exists(self.state_path):
+            self.state = json.load(open(self.state_path))
+        # path -> (stat signature, time the signature was first seen) of files waiting to settle
+        self.pending = {}
+        # path -> stat signature of files which failed, retried once they change again
+        self.failed = {}
+
+
+    def run(self, polls=None):
+        """ polls until interrupted, or `polls` times """
+        n = 0
+        try:
+            while polls is None or n < polls:
+                self.poll()
+                n += 1
+                if polls is None or n < polls:
+                    time.sleep(self.interval)
+        except KeyboardInterrupt:
+            logger.info('stopped watching %s', self.dirname)
+
+
+    def poll(self):
+        """ processes the files which have changed and then settled since the last poll, returns their paths """
+        now = time.time()
+        processed = []
+        for path in self.changed():
+            sig = _signature(path)
+            if sig is None:
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != sig:
+                self.pending[path] = (sig, now)
+                continue
+            if now - seen[1] < self.debounce:
+                continue
+            del self.pending[path]
+            try:
+                self.process(path, sig)
+                self.failed.pop(path, None)
+                processed.append(path)
+            except Exception:
+                self.failed[path] = sig
+                sys.stderr.write('limnify: %s failed:\n%s\n' % (path, traceback.format_exc()))
+        if processed:
+            _atomic_write(self.state_path, json.dumps(self.state, indent=2, sort_keys=True))
+        return processed
+
+
+    def changed(self):
+        """ the paths in the watched directory matching `pattern` whose size, mtime or inode differ from the last processed ones """
+        paths = []
+        for fn in sorted(os.listdir(self.dirname)):
+            path = os.path.join(self.dirname, fn)
+            if not fnmatch.fnmatch(fn, self.pattern) or not os.path.isfile(path):
+                continue
+            sig = _signature(path)
+            entry = self.state.get(path)
+            if sig == self.failed.get(path):
+                continue
+            if entry is None or sig != entry['sig']:
+                paths.append(path)
+            else:
+                self.pending.pop(path, None)
+        return paths
+
+
+    def process(self, path, sig):
+        """ limnifies `path`, only reading what was appended since it was last processed when possible """
+        args = copy.copy(self.args)
+        args.data = path
+        entry = self.state.get(path)
+        size = sig[1]
+        if columnar.format_of(path) is not None:
+            # columnar files are rewritten rather than appended to, so they are always read whole
+            logger.info('limnifying %s', path)
+            limnify.limnify(args)
+            self.state[path] = {'sig' : sig, 'header' : '', 'offset' : size, 'end' : size}
+            return
+        with open(path, 'rb') as f:
+            header = '' if args.header else f.readline()
+            incremental = (entry is not None and entry['sig'][0] == sig[0]
+                           and entry['end'] <= size and entry['header'] == header)
+            start = entry['offset'] if incremental else len(header)
+            f.seek(start)
+            body = f.read(size - start)
+        # only complete lines, a partly written last line is left for the next poll
+        body = body[:body.rfind('\n') + 1]
+        if body.strip():
+            logger.info('limnifying %s from byte %d%s', path, start, ' (appending)' if incremental else '')
+            limnify.limnify(args, data=StringIO(header + body), append=incremental)
+            offset = start + _last_date_offset(body, header, args)
+        else:
+            offset = start
+        self.state[path] = {'sig' : sig, 'header' : header, 'offset' : offset, 'end' : start + len(body)}
+
+
+def _signature(path):
+    """ (inode, size, mtime) of `path`, or None if it has disappeared """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_ino, stat.st_size, stat.st_mtime]
+
+
+def _last_date_offset(body, header, args):
+    """
+    returns the offset into `body` of the first line of the run of lines at its end which share
+    the last line's date, which is where the next incremental read has to start from to re-aggregate
+    that date.  Scans backwards from the end so only the last date's lines are looked at
+    """
+    delim = args.delim
+    if isinstance(args.datecol, int):
+        col = args.datecol
+    else:
+        names = args.header if args.header else header.rstrip('\r\n').split(delim)
+        col = list(names).index(args.datecol)
+
+    date_of = lambda line : line.rstrip('\r\n').split(delim)[col] if line.strip() else None
+    lines = body.splitlines(True)
+    offset = len(body)
+    last = None
+    for line in reversed(lines):
+        date = date_of(line)
+        if date is not None:
+            if last is None:
+                last = date
+            elif date != last:
+                break
+        offset -= len(line)
+    return offset
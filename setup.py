@@ -10,11 +10,15 @@ setup(
     author='Evan Rosen',
     author_email='erosen@wikimedia.org',
     install_requires=[
-        "pandas >= 0.9.0",
+        # pd.to_numeric and categoricals need 0.17, Resampler.agg 0.18, pd.tseries.index is gone in 0.20
+        "pandas >= 0.18.0, < 0.20",
+        "numpy >= 1.7.0",
+        "python-dateutil >= 2.0",
         "pyyaml >= 3.10"
         ],
     entry_points={
-        'console_scripts': ['limnify = limnpy.limnify:main']
+        'console_scripts': ['limnify = limnpy.limnify:main',
+                            'limnpy = limnpy.cli:main']
         }
     )
 
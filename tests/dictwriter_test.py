@@ -1,10 +1,12 @@
-import limnpy, datetime
+import limnpy, datetime, json
 writer = limnpy.DictWriter('evan_test', "Evan's Test", keys=['date', 'x', 'y'])
 rows = [{'date' : datetime.date(2012, 9, 1), 'x' : 1, 'y' : 2},
         {'date' : datetime.date(2012, 10, 1), 'x' : 7, 'y' : 9},]
 for row in rows:
     writer.writerow(row)
 
-writer.writesource()
-hash(open('./datasources/evan_test.yaml').read())
-hash(open('./datafiles/evan_test.csv').read())
+writer.close()
+source = json.load(open('./datasources/evan_test.json'))
+assert source['timespan']['start'] == '2012/09/01' and source['timespan']['end'] == '2012/10/01'
+assert [col['label'] for col in source['columns']] == ['date', 'x', 'y']
+assert open('./datafiles/evan_test.csv').read() == 'date,x,y\n2012/09/01,1,2\n2012/10/01,7,9\n'